@@ -0,0 +1,118 @@
+import numpy as np
+
+
+def get_first_crossing_indices(values, thresholds):
+    """
+    Finds the first year index at which the values cross each threshold,
+    that is the first index y where values[..., y] and values[..., y + 1]
+    are strictly on opposite sides of the threshold. Years are on the last
+    axis.
+    Args:
+      values: an array with shape (..., num_years).
+      thresholds: a threshold, or a list of thresholds.
+    Returns:
+      an array with shape values.shape[:-1] for a single threshold, or
+      (len(thresholds),) + values.shape[:-1] for a list, with -1 where there
+      is no crossing.
+    """
+    values = np.asarray(values, dtype=float)
+    thresholds = np.asarray(thresholds, dtype=float)
+    thresholds = thresholds.reshape(thresholds.shape + (1,) * values.ndim)
+    above = values > thresholds
+    below = values < thresholds
+    crossed = ((below[..., :-1] & above[..., 1:]) |
+               (above[..., :-1] & below[..., 1:]))
+    indices = np.argmax(crossed, axis=-1)
+    return np.where(crossed.any(axis=-1), indices, -1)
+
+
+def get_crossing_years(values, years, thresholds):
+    """
+    Finds the first year in which the values cross each threshold, as in
+    plotting.get_crossing_dates.
+    Args:
+      values: an array with shape (..., num_years).
+      years: the years of the columns of values.
+      thresholds: a threshold, or a list of thresholds.
+    Returns:
+      a float array shaped like get_first_crossing_indices, with NaN where
+      there is no crossing.
+    """
+    indices = get_first_crossing_indices(values, thresholds)
+    years = np.asarray(years, dtype=float)
+    return np.where(indices >= 0, years[np.maximum(indices, 0)], np.nan)
+
+
+def get_crossing_distributions(values_list, years, thresholds):
+    """
+    Counts the first crossing years of several scenarios.
+    Args:
+      values_list: a list of arrays with shape (num_simulations, num_years),
+        one per scenario.
+      years: the years of the columns of values.
+      thresholds: the list of thresholds.
+    Returns:
+      counts with shape (num_scenarios, num_thresholds, num_years - 1), where
+      counts[..., y] is the number of simulations which first cross in
+      years[y], and the number of simulations which never cross, with shape
+      (num_scenarios, num_thresholds).
+    """
+    num_bins = len(years) - 1
+    counts = np.zeros((len(values_list), len(thresholds), num_bins), dtype=np.int64)
+    never = np.zeros((len(values_list), len(thresholds)), dtype=np.int64)
+    for i, values in enumerate(values_list):
+        indices = get_first_crossing_indices(values, thresholds)
+        for j in range(len(thresholds)):
+            crossed = indices[j][indices[j] >= 0]
+            counts[i, j] = np.bincount(crossed, minlength=num_bins)
+            never[i, j] = indices.shape[1] - len(crossed)
+    return counts, never
+
+
+def get_prob_less(a, b):
+    """
+    Computes P(A < B) for independent samples of A and B, ignoring NaNs,
+    with one sort and a binary search.
+    """
+    a = np.asarray(a, dtype=float)
+    b = np.sort(np.asarray(b, dtype=float))
+    return _get_prob_less_sorted(a[~np.isnan(a)], b[~np.isnan(b)])
+
+
+def _get_prob_less_sorted(a, sorted_b):
+    if len(a) == 0 or len(sorted_b) == 0:
+        return np.nan
+    num_greater = len(sorted_b) - np.searchsorted(sorted_b, a, side='right')
+    return float(num_greater.sum()) / (len(a) * len(sorted_b))
+
+
+def get_prob_a_lower_than_b(dates_a, dates_b):
+    """
+    The probability that scenario A's assets are lower than scenario B's,
+    measured as the probability that B reaches the threshold in an earlier
+    year than A, as in financial_comparison.ipynb.
+    Args:
+      dates_a: the crossing years of scenario A.
+      dates_b: the crossing years of scenario B.
+    """
+    return get_prob_less(dates_b, dates_a)
+
+
+def compare_scenarios(samples_list):
+    """
+    Computes P(X_i < X_j) for every pair of scenarios, for example of their
+    crossing years.
+    Args:
+      samples_list: a list of 1-D sample arrays, one per scenario. NaNs are
+        ignored.
+    Returns:
+      an array with shape (num_scenarios, num_scenarios).
+    """
+    samples_list = [np.asarray(samples, dtype=float) for samples in samples_list]
+    samples_list = [np.sort(samples[~np.isnan(samples)]) for samples in samples_list]
+    num_scenarios = len(samples_list)
+    probs = np.empty((num_scenarios, num_scenarios))
+    for i, a in enumerate(samples_list):
+        for j, b in enumerate(samples_list):
+            probs[i, j] = _get_prob_less_sorted(a, b)
+    return probs
@@ -0,0 +1,134 @@
+import numpy as np
+
+
+def get_covariance_factor(covariance):
+    """
+    Factors a covariance matrix as L L^T. Uses the Cholesky decomposition,
+    falling back to an eigendecomposition for positive semi-definite
+    matrices, for example with a riskless cash asset.
+    Returns:
+      the lower triangular (or square) factor L.
+    """
+    covariance = np.asarray(covariance, dtype=float)
+    if covariance.ndim != 2 or covariance.shape[0] != covariance.shape[1]:
+        raise ValueError('covariance must be a square matrix, not shape %s' % (covariance.shape,))
+    if not np.allclose(covariance, covariance.T):
+        raise ValueError('covariance must be symmetric')
+    try:
+        return np.linalg.cholesky(covariance)
+    except np.linalg.LinAlgError:
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        if eigenvalues.min() < -1e-10 * max(eigenvalues.max(), 1.0):
+            raise ValueError('covariance must be positive semi-definite')
+        return eigenvectors * np.sqrt(np.clip(eigenvalues, 0.0, None))
+
+
+class multi_asset_return:
+    """
+    The annual rate of return of a portfolio of correlated assets which is
+    rebalanced to the allocations at the start of every year. It can be
+    used wherever simulation.simulate_portfolio takes annual_rate_of_return.
+    Args:
+      parameter_name: the name of the parameter.
+      asset_names: the names of the assets.
+      means: the mean annual rate of return of each asset, e.g. 1.06.
+      covariance: the covariance matrix of the annual rates of return.
+      allocations: the fraction of the portfolio in each asset, with shape
+        (num_assets,), or a glide path with shape (num_years, num_assets).
+      start_year: the first simulated year.
+      end_year: the year in which the simulation ends.
+    """
+    def __init__(self, parameter_name, asset_names, means, covariance, allocations,
+                 start_year, end_year):
+        num_years = end_year - start_year
+        self._parameter_name = parameter_name
+        self._asset_names = list(asset_names)
+        self._means = np.asarray(means, dtype=float)
+        self._covariance = np.asarray(covariance, dtype=float)
+        if len(self._asset_names) != len(self._means) or len(self._covariance) != len(self._means):
+            raise ValueError('asset_names, means and covariance must have one entry per asset')
+        self._factor = get_covariance_factor(self._covariance)
+        self._allocations = np.broadcast_to(
+            np.asarray(allocations, dtype=float), (num_years, len(self._means))).copy()
+        self._start_year = start_year
+        self._end_year = end_year
+
+        # With annual rebalancing each year's return is a fixed combination
+        # of normal asset returns, so it is itself normal with these moments.
+        self._portfolio_means = self._allocations.dot(self._means)
+        self._portfolio_stddevs = np.sqrt(np.einsum(
+            'ya,ab,yb->y', self._allocations, self._covariance, self._allocations).clip(0.0))
+
+    def get_param_name(self):
+        return self._parameter_name
+
+    def get_asset_names(self):
+        return self._asset_names
+
+    def get_allocations(self):
+        """
+        Returns the allocations in every year, with shape (num_years, num_assets).
+        """
+        return self._allocations
+
+    def get_portfolio_means(self):
+        return self._portfolio_means
+
+    def get_portfolio_stddevs(self):
+        return self._portfolio_stddevs
+
+    def get_simulated_values(self, size, rng=None):
+        """
+        Draws the portfolio's rates of return with shape (num_simulations,
+        num_years). If rng is None, the global numpy random state is used.
+        """
+        rng = np.random if rng is None else rng
+        return self.get_values_from_shocks(rng.standard_normal(size))
+
+    def get_values_from_shocks(self, shocks):
+        """
+        Converts standard normal shocks with shape (..., num_years) into the
+        portfolio's rates of return.
+        """
+        return self._portfolio_means + self._portfolio_stddevs * shocks
+
+    def get_monthly_values(self, size, rng=None):
+        """
+        Draws monthly growth factors with shape (num_months, num_simulations),
+        where each year's factors match the mean and variance of its annual
+        rate of return, as simulated_parameter.get_monthly_values does.
+        """
+        rng = np.random if rng is None else rng
+        num_months = size[0]
+        monthly_means = self._portfolio_means**(1.0 / 12.0)
+        monthly_second_moments = (self._portfolio_stddevs**2 + self._portfolio_means**2)**(1.0 / 12.0)
+        monthly_stddevs = np.sqrt(np.clip(monthly_second_moments - monthly_means**2, 0.0, None))
+        shape = (num_months,) + (1,) * (len(size) - 1)
+        return (np.repeat(monthly_means, 12)[:num_months].reshape(shape) +
+                np.repeat(monthly_stddevs, 12)[:num_months].reshape(shape) * rng.standard_normal(size))
+
+    def get_asset_values(self, num_simulations, rng=None):
+        """
+        Draws correlated rates of return for every asset, with one batched
+        multiply of all standard normal shocks by the covariance factor.
+        Returns:
+          an array with shape (num_simulations, num_years, num_assets).
+        """
+        rng = np.random if rng is None else rng
+        shocks = rng.standard_normal((num_simulations, len(self._allocations), len(self._means)))
+        return self.get_asset_values_from_shocks(shocks)
+
+    def get_asset_values_from_shocks(self, shocks):
+        """
+        Converts independent standard normal shocks with shape (...,
+        num_assets) into correlated rates of return for every asset.
+        """
+        return self._means + np.matmul(shocks, self._factor.T)
+
+    def get_portfolio_values(self, asset_values):
+        """
+        Combines the rates of return of every asset, with shape
+        (num_simulations, num_years, num_assets), into the portfolio's rates
+        of return with shape (num_simulations, num_years).
+        """
+        return np.einsum('nya,ya->ny', asset_values, self._allocations)
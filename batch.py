@@ -0,0 +1,173 @@
+################################################################################
+#
+# Runs a batch of portfolio scenarios without a notebook or display.
+#
+# Usage:
+#   python batch.py scenarios.json --output summary.json --workers 8
+#
+# The input file holds a list of scenarios, and optionally defaults which
+# apply to every scenario:
+#   {
+#     "defaults": {"start_year": 2020, "end_year": 2090,
+#                  "num_simulations": 100000, "seed": 1,
+#                  "thresholds": [3000000.0]},
+#     "scenarios": [
+#       {"name": "baseline",
+#        "initial_value": 400000.0,
+#        "annual_rate_of_return": {"mean": 1.06, "stddev": 0.15},
+#        "payments": [
+#          {"name": "salary", "annual_sum": 200000, "annual_change": 1.02,
+#           "payment_stdev": 0.02, "start_year": 2020, "end_year": 2050}],
+#        "mortgage": {"principal_loan_amount": 1600000,
+#                     "loan_down_payment": 400000,
+#                     "annual_interest_rate": 0.02,
+#                     "mortgage_term_years": 30, "start_year": 2022}}
+#     ]
+#   }
+#
+# The output holds, for each scenario, the per-year quantiles and means of
+# the portfolio value and net income, and the first-crossing histogram of
+# each threshold.
+#
+################################################################################
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import mortgage as mg
+import plotting
+import runner
+import simulation as sim
+
+
+def build_scenario(definition):
+    """
+    Converts a scenario definition into simulate_portfolio arguments.
+    Returns:
+      a dictionary of keyword arguments for runner.simulate_portfolio_sharded.
+    """
+    start_year = definition['start_year']
+    end_year = definition['end_year']
+    rate_of_return = definition['annual_rate_of_return']
+    payments = [
+        sim.recurring_payment(
+            p['name'],
+            p['annual_sum'],
+            p.get('annual_change', 1.0),
+            p.get('payment_stdev', 0.0),
+            p['start_year'],
+            p['end_year'])
+        for p in definition.get('payments', [])]
+    mortgage = None
+    if definition.get('mortgage'):
+        mortgage = mg.mortgage(**definition['mortgage'])
+    return {
+        'initial_value': definition['initial_value'],
+        'annual_rate_of_return': sim.simulated_parameter(
+            'annual_rate_of_return',
+            rate_of_return['mean'],
+            rate_of_return['stddev'],
+            start_year,
+            end_year),
+        'annual_payments': payments,
+        'mortgage': mortgage,
+        'start_year': start_year,
+        'end_year': end_year,
+        'num_simulations': definition['num_simulations'],
+        'seed': definition.get('seed'),
+        'thresholds': definition.get('thresholds', []),
+    }
+
+
+def run_scenario(definition, num_workers=1):
+    """
+    Simulates one scenario in streaming mode and summarizes it.
+    Args:
+      definition: the scenario definition.
+      num_workers: the number of processes for the scenario's shards.
+    Returns:
+      a JSON-serializable dictionary of the results.
+    """
+    probs = definition.get('probs', plotting.CONFIDENCE_PROBS)
+    scenario = build_scenario(definition)
+    values, net_incomes = runner.simulate_portfolio_sharded(
+        num_workers=num_workers,
+        shard_size=definition.get('chunk_size', 10000),
+        summarize=True,
+        **scenario)
+    counts, never = values.get_crossing_counts()
+    crossings = []
+    for i, threshold in enumerate(scenario['thresholds']):
+        crossings.append({
+            'threshold': threshold,
+            'years': values.crossings_.get_years().tolist(),
+            'counts': counts[i].tolist(),
+            'never': int(never[i]),
+            'probability': float(counts[i].sum()) / max(values.get_count(), 1),
+        })
+    return {
+        'name': definition.get('name'),
+        'years': list(range(scenario['start_year'], scenario['end_year'] + 1)),
+        'num_simulations': values.get_count(),
+        'seed': scenario['seed'],
+        'probs': list(probs),
+        'values': {
+            'quantiles': values.get_quantiles(probs).tolist(),
+            'means': values.get_means().tolist(),
+        },
+        'net_incomes': {
+            'quantiles': net_incomes.get_quantiles(probs).tolist(),
+            'means': net_incomes.get_means().tolist(),
+        },
+        'crossings': crossings,
+    }
+
+
+def load_scenarios(path):
+    """
+    Reads the scenario definitions, applying the defaults to each.
+    """
+    with open(path) as f:
+        batch = json.load(f)
+    if isinstance(batch, list):
+        batch = {'scenarios': batch}
+    defaults = batch.get('defaults', {})
+    return [dict(defaults, **scenario) for scenario in batch['scenarios']]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Simulates a batch of portfolio scenarios from a JSON file.')
+    parser.add_argument('scenarios', help='JSON file of scenario definitions')
+    parser.add_argument('--output', help='file to write the summaries to, default stdout')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of processes, default one per core')
+    args = parser.parse_args(argv)
+
+    definitions = load_scenarios(args.scenarios)
+    num_workers = args.workers or os.cpu_count() or 1
+    if num_workers == 1 or len(definitions) < num_workers:
+        # Too few scenarios to keep every worker busy, so run them one at a
+        # time with their shards spread over the workers instead.
+        results = [run_scenario(definition, num_workers) for definition in definitions]
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            results = list(executor.map(run_scenario, definitions))
+
+    output = json.dumps({'scenarios': results}, indent=2,
+                        default=lambda value: np.asarray(value).tolist())
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
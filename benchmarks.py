@@ -0,0 +1,250 @@
+################################################################################
+#
+# Benchmarks for the simulation, plotting reductions and mortgage schedules.
+#
+# Usage:
+#   python benchmarks.py --output bench.json
+#   python benchmarks.py --output bench.json --baseline baseline.json
+#
+# Each case records the best wall time per call over the repeats, where each
+# repeat calls the case enough times to run for at least --min-time seconds
+# so that very short cases are not dominated by timer noise, the peak memory
+# allocated while it runs, and the number of paths per second where that
+# applies. With --baseline, the run fails if any case is slower than the
+# baseline by more than --threshold.
+#
+################################################################################
+
+import argparse
+import json
+import platform
+import sys
+import timeit
+import tracemalloc
+
+import numpy as np
+
+import mortgage as mg
+import plotting
+import simulation as sim
+import streaming
+
+START_YEAR = 2020
+SEED = 12345
+
+
+def make_payments(num_payments, start_year, end_year):
+    """
+    Builds a fixed set of alternating incomes and expenses spread over the
+    years of the simulation.
+    """
+    rng = np.random.default_rng(SEED)
+    num_years = end_year - start_year
+    payments = []
+    for i in range(num_payments):
+        sign = 1.0 if i % 2 == 0 else -1.0
+        payment_start = start_year + int(rng.integers(0, max(num_years // 2, 1)))
+        payments.append(sim.recurring_payment(
+            'payment%d' % i,
+            sign * float(rng.uniform(10000, 200000)),
+            float(rng.uniform(0.98, 1.05)),
+            float(rng.uniform(0.01, 0.1)),
+            payment_start,
+            payment_start + int(rng.integers(1, num_years + 1))))
+    return payments
+
+
+def make_mortgage():
+    return mg.mortgage(
+        principal_loan_amount=1600000,
+        loan_down_payment=400000,
+        annual_interest_rate=0.02,
+        mortgage_term_years=30,
+        start_year=START_YEAR + 2)
+
+
+class balance_sheet:
+    """
+    A fixed balance sheet for the investment property benchmarks.
+    """
+    def get_cash_flow(self):
+        return 500.0
+
+    def get_monthly_cash_flow(self):
+        return 500.0
+
+    def get_total_one_time_costs(self):
+        return 20000.0
+
+
+def simulate_case(num_simulations, num_years, num_payments, streaming_mode=False):
+    end_year = START_YEAR + num_years
+    payments = make_payments(num_payments, START_YEAR, end_year)
+    ror = sim.simulated_parameter('annual_rate_of_return', 1.06, 0.15, START_YEAR, end_year)
+    mortgage = make_mortgage()
+
+    def run():
+        rng = np.random.default_rng(SEED)
+        if streaming_mode:
+            streaming.summarize_portfolio(
+                400000.0, ror, payments, mortgage, START_YEAR, end_year,
+                num_simulations, thresholds=[3000000.0], rng=rng)
+        else:
+            sim.simulate_portfolio_arrays(
+                400000.0, ror, payments, mortgage, START_YEAR, end_year,
+                num_simulations, rng=rng)
+    return run
+
+
+def reduction_case(function, num_simulations=10000, num_years=70):
+    end_year = START_YEAR + num_years
+    values, _ = sim.simulate_portfolio_arrays(
+        400000.0,
+        sim.simulated_parameter('annual_rate_of_return', 1.06, 0.15, START_YEAR, end_year),
+        make_payments(8, START_YEAR, end_year),
+        make_mortgage(),
+        START_YEAR,
+        end_year,
+        num_simulations,
+        rng=np.random.default_rng(SEED))
+    years = list(range(START_YEAR, end_year + 1))
+    if function == 'get_confidence_interval':
+        return lambda: plotting.get_confidence_interval(values)
+    if function == 'get_crossing_dates':
+        return lambda: plotting.get_crossing_dates(values, years, 3000000.0)
+    raise ValueError('unknown reduction %r' % function)
+
+
+def mortgage_case(function, num_extra_payments=1):
+    prop = mg.investment_property(make_mortgage(), balance_sheet(), 2000000.0, 0.03)
+    if function == 'calculate_all':
+        return lambda: prop.calculate_all(100.0)
+    if function == 'calculate_schedule':
+        extra = np.linspace(0.0, 20000.0, num_extra_payments)
+        return lambda: prop.calculate_schedule(extra)
+    raise ValueError('unknown mortgage function %r' % function)
+
+
+def get_cases(quick=False):
+    """
+    Returns a list of (name, setup, num_paths) tuples, where setup builds the
+    function to time.
+    """
+    cases = []
+    path_counts = [1000, 10000] if quick else [1000, 10000, 100000]
+    for n in path_counts:
+        cases.append(('simulate/paths=%d' % n,
+                      lambda n=n: simulate_case(n, 70, 8), n))
+    streaming_counts = [10000, 100000] if quick else [10000, 100000, 1000000]
+    for n in streaming_counts:
+        cases.append(('summarize/paths=%d' % n,
+                      lambda n=n: simulate_case(n, 70, 8, streaming_mode=True), n))
+    for num_years in [10, 25, 50, 100]:
+        cases.append(('simulate/years=%d' % num_years,
+                      lambda y=num_years: simulate_case(10000, y, 8), 10000))
+    for num_payments in [1, 5, 10, 25, 50]:
+        cases.append(('simulate/payments=%d' % num_payments,
+                      lambda p=num_payments: simulate_case(10000, 70, p), 10000))
+    for function in ['get_confidence_interval', 'get_crossing_dates']:
+        cases.append(('plotting/%s' % function,
+                      lambda f=function: reduction_case(f), 10000))
+    cases.append(('mortgage/calculate_all', lambda: mortgage_case('calculate_all'), None))
+    cases.append(('mortgage/calculate_schedule/extra=1000',
+                  lambda: mortgage_case('calculate_schedule', 1000), None))
+    return cases
+
+
+def run_case(setup, num_paths, repeats, min_time=0.2):
+    function = setup()
+    function()  # Warm up caches and imports.
+    # tracemalloc slows allocation, so measure the peak memory in a separate
+    # call from the timing.
+    tracemalloc.start()
+    function()
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    # Call the case enough times that each repeat takes at least min_time,
+    # and report the best time per call.
+    timer = timeit.Timer(function)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed * 10 >= min_time else 10
+    times = [elapsed] + timer.repeat(repeat=repeats - 1, number=number)
+    wall_time = min(times) / number
+    result = {'wall_time': wall_time, 'peak_bytes': peak_bytes, 'number': number}
+    if num_paths:
+        result['paths_per_second'] = num_paths / wall_time
+    return result
+
+
+def compare(results, baseline, threshold):
+    """
+    Compares the wall times against a baseline.
+    Returns:
+      a list of (name, ratio) for cases slower than threshold times the
+      baseline.
+    """
+    regressions = []
+    for name, result in results['cases'].items():
+        if name not in baseline['cases']:
+            continue
+        ratio = result['wall_time'] / baseline['cases'][name]['wall_time']
+        if ratio > threshold:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmarks the simulation, plotting and mortgage code.')
+    parser.add_argument('--output', help='file to write the results to, as JSON')
+    parser.add_argument('--baseline', help='results file to compare against')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='fail if a case is this many times slower than the baseline')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='minimum duration in seconds of each repeat of a case')
+    parser.add_argument('--quick', action='store_true', help='skip the largest cases')
+    parser.add_argument('--filter', default='', help='only run cases containing this string')
+    args = parser.parse_args(argv)
+
+    results = {
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'seed': SEED,
+        },
+        'cases': {},
+    }
+    for name, setup, num_paths in get_cases(args.quick):
+        if args.filter not in name:
+            continue
+        result = run_case(setup, num_paths, args.repeats, args.min_time)
+        results['cases'][name] = result
+        print('%-45s %10.4f s %10.1f MB %s' % (
+            name, result['wall_time'], result['peak_bytes'] / 1e6,
+            ('%12.0f paths/s' % result['paths_per_second'])
+            if 'paths_per_second' in result else ''))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, ratio in regressions:
+            print('REGRESSION %s: %.2fx slower than baseline' % (name, ratio))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
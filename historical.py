@@ -0,0 +1,157 @@
+import os
+
+import numpy as np
+
+BOOTSTRAP_METHODS = ('stationary', 'moving')
+
+
+def load_returns(path):
+    """
+    Loads a series of historical returns as a read-only memory-mapped array.
+    A .npy file is mapped directly. For a CSV file, the last column of every
+    numeric row is used, so a header and a date column are allowed; the
+    series is converted once to a .npy file next to the CSV, which is
+    rebuilt when the CSV is newer.
+    Args:
+      path: the path of a .npy or .csv file, as a str or os.PathLike.
+    Returns:
+      a 1-D array of returns.
+    """
+    path = os.fspath(path)
+    if path.endswith('.npy'):
+        returns = np.load(path, mmap_mode='r')
+    else:
+        npy_path = path + '.npy'
+        if (not os.path.exists(npy_path) or
+                os.path.getmtime(npy_path) < os.path.getmtime(path)):
+            table = np.genfromtxt(path, delimiter=',', ndmin=2)
+            column = table[:, -1]
+            column = column[~np.isnan(column)]
+            # Write to a temporary file first so an interrupted or concurrent
+            # write never leaves a truncated .npy behind.
+            temp_path = npy_path + '.%d.tmp' % os.getpid()
+            try:
+                with open(temp_path, 'wb') as f:
+                    np.save(f, column)
+                os.replace(temp_path, npy_path)
+            except OSError:
+                # The CSV's directory is read-only, so keep the series in memory.
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                return column
+        returns = np.load(npy_path, mmap_mode='r')
+    if returns.ndim != 1:
+        raise ValueError('%s must hold a 1-D series of returns, not shape %s' %
+                         (path, returns.shape))
+    return returns
+
+
+def get_bootstrap_indices(series_length, shape, block_length, method='stationary', rng=None):
+    """
+    Draws block bootstrap indices into a series for every path at once.
+    Args:
+      series_length: the length of the resampled series.
+      shape: (num_paths, num_periods), the shape of the indices.
+      block_length: the block length, or the mean block length for the
+        stationary bootstrap.
+      method: 'stationary' for blocks of geometric length which wrap around
+        the end of the series (Politis and Romano), or 'moving' for
+        overlapping blocks of fixed length.
+      rng: a numpy Generator, or None to use the global numpy random state.
+    Returns:
+      an integer array of indices with the given shape.
+    """
+    if method not in BOOTSTRAP_METHODS:
+        raise ValueError('method must be one of %s, not %r' % (BOOTSTRAP_METHODS, method))
+    rng = np.random if rng is None else rng
+    num_paths, num_periods = shape
+    periods = np.arange(num_periods)
+    if method == 'moving':
+        block_length = min(int(block_length), series_length)
+        num_blocks = -(-num_periods // block_length)
+        starts = (rng.random((num_paths, num_blocks)) *
+                  (series_length - block_length + 1)).astype(np.int64)
+        return starts[:, periods // block_length] + periods % block_length
+
+    # A new block starts at the first period and then with probability
+    # 1 / block_length in every period. Each period continues from the start
+    # of its block.
+    new_block = rng.random(shape) < 1.0 / block_length
+    new_block[:, 0] = True
+    block_starts = np.maximum.accumulate(np.where(new_block, periods, 0), axis=1)
+    starts = (rng.random(shape) * series_length).astype(np.int64)
+    first_indices = np.take_along_axis(starts, block_starts, axis=1)
+    return (first_indices + periods - block_starts) % series_length
+
+
+class historical_return:
+    """
+    An annual rate of return resampled from a historical series with a block
+    bootstrap, which keeps the fat tails and the short-term autocorrelation
+    of the series. It can be used wherever simulation.simulate_portfolio
+    takes annual_rate_of_return, except with shock based sampling.
+    Args:
+      parameter_name: the name of the parameter.
+      returns: the historical returns, or the path of a .npy or .csv file
+        for load_returns, as a str or os.PathLike.
+      start_year: the first simulated year.
+      end_year: the year in which the simulation ends.
+      periods_per_year: 1 for annual returns or 12 for monthly returns.
+        Monthly returns are resampled month by month and compounded into
+        annual rates of return.
+      block_length: the (mean) block length, in periods of the series.
+      method: one of BOOTSTRAP_METHODS, see get_bootstrap_indices.
+      growth: True if the returns are growth factors, e.g. 1.06, or False if
+        they are rates, e.g. 0.06.
+    """
+    def __init__(self, parameter_name, returns, start_year, end_year, periods_per_year=1,
+                 block_length=5, method='stationary', growth=True):
+        if method not in BOOTSTRAP_METHODS:
+            raise ValueError('method must be one of %s, not %r' % (BOOTSTRAP_METHODS, method))
+        if periods_per_year not in (1, 12):
+            raise ValueError('periods_per_year must be 1 or 12, not %r' % periods_per_year)
+        self._parameter_name = parameter_name
+        self._returns = (load_returns(returns) if isinstance(returns, (str, os.PathLike))
+                         else np.asarray(returns))
+        self._start_year = start_year
+        self._end_year = end_year
+        self._periods_per_year = periods_per_year
+        self._block_length = block_length
+        self._method = method
+        self._offset = 0.0 if growth else 1.0
+        if len(self._returns) == 0:
+            raise ValueError('the series of returns is empty')
+
+    def get_param_name(self):
+        return self._parameter_name
+
+    def get_returns(self):
+        return self._returns
+
+    def _get_growth(self, shape, rng):
+        indices = get_bootstrap_indices(
+            len(self._returns), shape, self._block_length, self._method, rng)
+        return self._returns[indices] + self._offset
+
+    def get_simulated_values(self, size, rng=None):
+        """
+        Draws resampled annual rates of return with shape (num_simulations,
+        num_years). If rng is None, the global numpy random state is used.
+        """
+        num_simulations, num_years = size
+        growth = self._get_growth(
+            (num_simulations, num_years * self._periods_per_year), rng)
+        if self._periods_per_year == 1:
+            return growth
+        return growth.reshape(num_simulations, num_years, self._periods_per_year).prod(axis=2)
+
+    def get_monthly_values(self, size, rng=None):
+        """
+        Draws resampled monthly growth factors with shape (num_months,
+        num_simulations). Annual returns are spread evenly over their months.
+        """
+        num_months, num_simulations = size
+        if self._periods_per_year == 12:
+            return self._get_growth((num_simulations, num_months), rng).T
+        annual = self._get_growth((num_simulations, -(-num_months // 12)), rng)
+        return np.repeat(annual**(1.0 / 12.0), 12, axis=1)[:, :num_months].T
@@ -0,0 +1,129 @@
+################################################################################
+#
+# Opt-in instrumentation for the simulation and plotting code.
+#
+# The simulation calls stage(), count() and record_bytes() at a handful of
+# points per call (never per path or per year). When no profile is active
+# these return immediately, so they can stay in production code.
+#
+# Usage:
+#   with instrumentation.profile() as report:
+#       values, net_incomes = sim.simulate_portfolio_arrays(...)
+#   print(report)
+#
+################################################################################
+
+import collections
+import contextlib
+import time
+
+# The stack of active reports. Every active report receives every event.
+_active_reports = []
+
+_null_stage = contextlib.nullcontext()
+
+
+class profile_report:
+    """
+    The timings, counters and allocated bytes collected while a profile is
+    active.
+    """
+    def __init__(self):
+        self.timings_ = collections.defaultdict(float)
+        self.calls_ = collections.defaultdict(int)
+        self.counters_ = collections.defaultdict(int)
+        self.bytes_ = collections.defaultdict(int)
+
+    def as_dict(self):
+        """
+        Returns the report as a dictionary of plain dictionaries.
+        """
+        return {
+            'timings': dict(self.timings_),
+            'calls': dict(self.calls_),
+            'counters': dict(self.counters_),
+            'bytes': dict(self.bytes_),
+        }
+
+    def __str__(self):
+        lines = ['%-30s %10s %8s' % ('stage', 'seconds', 'calls')]
+        for name, seconds in sorted(self.timings_.items(), key=lambda item: -item[1]):
+            lines.append('%-30s %10.4f %8d' % (name, seconds, self.calls_[name]))
+        for name, value in sorted(self.counters_.items()):
+            lines.append('%-30s %19d' % (name, value))
+        for name, value in sorted(self.bytes_.items()):
+            lines.append('%-30s %16.1f MB' % (name, value / 1e6))
+        return '\n'.join(lines)
+
+
+class _stage_timer:
+
+    def __init__(self, name):
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        elapsed = time.perf_counter() - self._start
+        for report in _active_reports:
+            report.timings_[self._name] += elapsed
+            report.calls_[self._name] += 1
+        return False
+
+
+def enabled():
+    return bool(_active_reports)
+
+
+def stage(name):
+    """
+    Returns a context manager which times the enclosed block as the named
+    stage, or a shared no-op context manager if no profile is active.
+    """
+    if not _active_reports:
+        return _null_stage
+    return _stage_timer(name)
+
+
+def count(name, value=1):
+    """
+    Adds value to the named counter of every active profile.
+    """
+    if not _active_reports:
+        return
+    for report in _active_reports:
+        report.counters_[name] += value
+
+
+def record_bytes(name, *arrays):
+    """
+    Adds the size of the arrays to the named byte count of every active
+    profile.
+    """
+    if not _active_reports:
+        return
+    num_bytes = sum(array.nbytes for array in arrays)
+    for report in _active_reports:
+        report.bytes_[name] += num_bytes
+
+
+@contextlib.contextmanager
+def profile(callback=None):
+    """
+    Collects instrumentation while the block runs.
+    Args:
+      callback: an optional function called with the profile_report when
+        the block exits, for example to log it from a batch job.
+    Yields:
+      the profile_report, which is filled in as the block runs.
+    """
+    report = profile_report()
+    _active_reports.append(report)
+    try:
+        yield report
+    finally:
+        _active_reports.remove(report)
+        if callback is not None:
+            callback(report)
@@ -0,0 +1,85 @@
+import numpy as np
+
+import instrumentation
+import simulation
+
+
+def get_monthly_mortgage_payments(mortgage, start_year, end_year,
+                                  additional_monthly_payment=0.0):
+    """
+    Places the mortgage's monthly payments, including any additional monthly
+    payment, on the monthly timeline of the simulation.
+    Returns:
+      an array with shape (12 * (end_year - start_year),).
+    """
+    num_months = 12 * (end_year - start_year)
+    payments = np.zeros(num_months)
+    if mortgage is None:
+        return payments
+    schedule = mortgage.calculate_monthly_payments(additional_monthly_payment)
+    offset = 12 * (mortgage.start_year_ - start_year)
+    first = max(offset, 0)
+    last = min(offset + len(schedule), num_months)
+    if last > first:
+        payments[first:last] = schedule[first - offset:last - offset]
+    return payments
+
+
+def simulate_portfolio_monthly(initial_value,
+                               annual_rate_of_return,
+                               annual_payments,
+                               mortgage,
+                               start_year,
+                               end_year,
+                               num_simulations,
+                               additional_monthly_payment=0.0,
+                               aggregate='annual',
+                               rng=None):
+    """
+    Simulates the portfolio with monthly steps. Returns are drawn monthly
+    from annual_rate_of_return.get_monthly_values. Each payment is spread
+    evenly over the months of its year, with the annual variance. The
+    mortgage is paid monthly, with any additional monthly payment, until
+    the debt is paid off. Other arguments are as for
+    simulation.simulate_portfolio_arrays.
+    Args:
+      additional_monthly_payment: the extra mortgage payment each month.
+      aggregate: 'annual' for values at the start of each year and net
+        incomes summed over each year, as simulate_portfolio_arrays returns,
+        or 'monthly' for every month.
+      rng: a numpy Generator, or None to use the global numpy random state.
+    Returns:
+      values and net incomes, each with shape (num_simulations, num_years + 1)
+      for 'annual', or (num_simulations, num_months + 1) for 'monthly'.
+    """
+    if aggregate not in ('annual', 'monthly'):
+        raise ValueError("aggregate must be 'annual' or 'monthly', not %r" % aggregate)
+    num_years = end_year - start_year
+    num_months = 12 * num_years
+    if not isinstance(annual_payments, simulation.payment_schedule):
+        annual_payments = simulation.payment_schedule(annual_payments, start_year, end_year)
+
+    # Everything is kept month-major, as (num_months, num_simulations).
+    with instrumentation.stage('simulation.rng'):
+        rng = np.random if rng is None else rng
+        rors = annual_rate_of_return.get_monthly_values((num_months, num_simulations), rng=rng)
+        new_incomes = (
+            np.repeat(annual_payments.get_mean_income() / 12.0, 12)[:, np.newaxis] +
+            np.repeat(annual_payments.get_income_stddev() / np.sqrt(12.0), 12)[:, np.newaxis] *
+            rng.standard_normal((num_months, num_simulations)))
+        instrumentation.count('simulation.rng_draws', 2 * num_months * num_simulations)
+    with instrumentation.stage('simulation.mortgage'):
+        new_incomes -= get_monthly_mortgage_payments(
+            mortgage, start_year, end_year, additional_monthly_payment)[:, np.newaxis]
+
+    with instrumentation.stage('simulation.recursion'):
+        # advance_values works month-major internally, so the transposed
+        # views are used without a copy.
+        values = np.moveaxis(simulation.advance_values(initial_value, rors.T, new_incomes.T), -1, 0)
+
+    if aggregate == 'annual':
+        values = values[::12]
+        new_incomes = new_incomes.reshape(num_years, 12, num_simulations).sum(axis=1)
+    net_incomes = np.concatenate([new_incomes[:1], new_incomes])
+    instrumentation.count('simulation.paths', num_simulations)
+    return values.T, net_incomes.T
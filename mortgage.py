@@ -9,12 +9,15 @@
 #  * calculate_debt_at_month(month, additional_monthly_payment)
 #  * calculate_years_until_paid_off(additional_annual_payment)
 #  * calculate_months_until_paid_off(additional_monthly_payment)
+#  * calculate_payoff_years(additional_annual_payment)
+#  * calculate_monthly_payments(additional_monthly_payment)
 #  * print_mortgage(additional_monthly_payment)
 #
 ################################################################################
 
-import matplotlib.pyplot as plt
-import scipy as scipy
+import numpy as np
+
+import plotting
 
 class mortgage:
     """
@@ -54,6 +57,21 @@ class mortgage:
     def get_monthly_payment(self):
         return self.get_annual_payment() / 12.0
 
+    def calculate_monthly_payments(self, additional_monthly_payment = 0.0):
+        """
+        Calculates the payment in every month of the mortgage term, which
+        stops once the debt is paid off.
+        Args:
+          * additional_monthly_payment: the amount paid each month beyond the
+            minimum required by the mortgage.
+        Returns:
+          * an array of payments, one per month since the loan was issued.
+        """
+        months = np.arange(int(12 * self.mortgage_term_years_))
+        debts = self.calculate_debt_at_month(months, additional_monthly_payment)
+        return np.where(
+            debts > 0, self.get_monthly_payment() + additional_monthly_payment, 0.0)
+
     def calculate_equity_at_year(self, year):
         """
         Calculates the equity in the property at a specified number of
@@ -96,6 +114,27 @@ class mortgage:
         return self.calculate_debt_at_year(month / 12.0,
                                            12.0 * additional_monthly_payment)
 
+    def calculate_payoff_years(self, additional_annual_payment = 0.0):
+        """
+        Solves debt(t) = 0 for the time at which the mortgage is paid, using
+        debt(t) = P z^t - payment (z^t - 1) / (z - 1) with z = 1 + rate.
+        Args:
+          * additional_annual_payment: the amount paid each year beyond the
+            minimum required by the mortgage. May be an array.
+        Returns:
+          * the (fractional) number of years until the debt reaches zero, or
+            infinity if the payment never covers the interest.
+        """
+        payment = self.get_annual_payment() + np.asarray(
+            additional_annual_payment, dtype=float)
+        rate = self.annual_interest_rate_
+        remaining = payment - self.principal_loan_amount_ * rate
+        with np.errstate(divide='ignore', invalid='ignore'):
+            years = np.where(remaining > 0,
+                             np.log(payment / remaining) / np.log(1.0 + rate),
+                             np.inf)
+        return years if years.ndim else float(years)
+
     def calculate_years_until_paid_off(self, additional_annual_payment = 0.0):
         """
         Calculates the number of years until the mortgage is paid.
@@ -105,10 +144,11 @@ class mortgage:
         Returns:
           * the number of years until the mortgage is paid.
         """
-        for year in range(self.mortgage_term_years_ + 1):
-            if self.calculate_debt_at_year(year, additional_annual_payment) < 0:
-                return year
-        return self.mortgage_term_years_
+        return self._first_period_with_negative_debt(
+            self.calculate_payoff_years(additional_annual_payment), 1,
+            lambda year: self.calculate_debt_at_year(
+                year, additional_annual_payment),
+            self.mortgage_term_years_, self.mortgage_term_years_)
 
     def calculate_months_until_paid_off(self, additional_monthly_payment = 0.0):
         """
@@ -119,11 +159,28 @@ class mortgage:
         Returns:
           * the number of months until the mortgage is paid.
         """
-        for month in range(12 * int(self.mortgage_term_years_) + 1):
-            if self.calculate_debt_at_month(
-                month, additional_monthly_payment) < 0:
-                return month
-        return (self.mortgage_term_years_ * 12.0)
+        return self._first_period_with_negative_debt(
+            self.calculate_payoff_years(12.0 * additional_monthly_payment), 12,
+            lambda month: self.calculate_debt_at_month(
+                month, additional_monthly_payment),
+            12 * int(self.mortgage_term_years_),
+            self.mortgage_term_years_ * 12.0)
+
+    def _first_period_with_negative_debt(self, payoff_years, periods_per_year,
+                                         calculate_debt, last_period, default):
+        """
+        Returns the first whole period at which the debt is negative, given
+        the analytic payoff time, or default if that is after last_period.
+        """
+        if payoff_years == float('inf'):
+            return default
+        period = int(payoff_years * periods_per_year) + 1
+        # Guard against rounding when the payoff falls on a period boundary.
+        if period > 0 and calculate_debt(period - 1) < 0:
+            period -= 1
+        elif calculate_debt(period) >= 0:
+            period += 1
+        return period if period <= last_period else default
 
     def calculate_value_at_year(self, year):
         """
@@ -236,6 +293,42 @@ class investment_property:
             month, additional_monthly_payment)
         return property_value - remaining_debt
 
+    def calculate_schedule(self, additional_monthly_payment):
+        """
+        Calculates the monthly debt, equity, value, and payment arrays.
+        Args:
+          * additional_monthly_payment: extra monthly payment beyond minimum.
+            May be a scalar or an array of values to evaluate at once.
+        Returns:
+          * a dictionary of 'months', 'debts', 'equities', 'payments', and
+            'values'. The per-month arrays have shape (num_months,) for a
+            scalar payment and (num_payments, num_months) for an array.
+          * the number of years until the property is paid off, for each
+            additional monthly payment.
+        """
+        extra = np.asarray(additional_monthly_payment, dtype=float)
+        months = np.arange(int(12 * self.mortgage_.mortgage_term_years_))
+        debts = self.mortgage_.calculate_debt_at_month(
+            months, extra[..., np.newaxis])
+        values = self.get_property_value_at_month(months)
+        equities = np.minimum(values - debts, values)
+        payments = np.where(
+            debts > 0, self.mortgage_.get_monthly_payment() + extra[..., np.newaxis], 0.0)
+
+        # The last month with remaining debt.
+        paid = debts > 0
+        last_month = months[-1] - np.argmax(paid[..., ::-1], axis=-1)
+        months_until_paid_off = np.where(paid.any(axis=-1), last_month, 0)
+
+        results = {
+            'months': months,
+            'debts': np.maximum(debts, 0.0),
+            'equities': equities,
+            'payments': payments,
+            'values': np.broadcast_to(values, debts.shape),
+        }
+        return results, months_until_paid_off / 12.0
+
     def calculate_all(self, additional_monthly_payment):
         """
         Calculates the equity, debt, value, and payment.
@@ -245,27 +338,23 @@ class investment_property:
           * the amount of debt, equity, property value, and payment size.
           * the number of years until the property is paid off.
         """
-        results = {
-            'months': list(
-                range(int(12 * self.mortgage_.mortgage_term_years_))),
-            'debts': [], 'equities': [], 'payments': [], 'values': []
-        }
-        months_until_paid_off = 0
-        for month in results['months']:
-            debt = self.mortgage_.calculate_debt_at_month(
-                month, additional_monthly_payment)
-            equity = self.calculate_equity_at_month(
-                month, additional_monthly_payment)
-            value = self.get_property_value_at_month(month)
-            results['debts'].append(debt if debt > 0 else 0.0)
-            results['equities'].append(equity if equity < value else value)
-            results['values'].append(value)
-            results['payments'].append(
-                (self.mortgage_.get_monthly_payment() +
-                 additional_monthly_payment)
-                if debt > 0 else 0.0)
-            if debt > 0: months_until_paid_off = month
-        return results, (months_until_paid_off / 12.0)
+        results, years_until_paid_off = self.calculate_schedule(
+            additional_monthly_payment)
+        results = {key: value.tolist() for key, value in results.items()}
+        return results, float(years_until_paid_off)
+
+    def calculate_gains(self, results):
+        """
+        Calculates the capital gains: the equity plus the cash flow received
+        so far, less the one time costs.
+        Args:
+          * results: the schedule returned by calculate_schedule.
+        Returns:
+          * the gains in every month, shaped like results['equities'].
+        """
+        cash_flow = self.balance_sheet_.get_cash_flow()
+        one_time_costs = self.balance_sheet_.get_total_one_time_costs()
+        return results['equities'] + results['months'] * float(cash_flow) - one_time_costs
 
     def plot_equity_and_debt(self, additional_monthly_payment):
         """
@@ -275,6 +364,7 @@ class investment_property:
         Returns:
           * A plot of the amount of debt, equity, property value, and payment size.
         """
+        import matplotlib.pyplot as plt
         results, _ = self.calculate_all(additional_monthly_payment)
         fig, ax = plt.subplots(figsize=(10,5))
         years = [month / 12.0 for month in results['months']]
@@ -282,12 +372,12 @@ class investment_property:
         ax.plot(years, results['values'], label='Property value', color='b')
         ax.plot(years, results['equities'], label='Equity', color='g')
         ax.fill_between(
-            years, scipy.zeros(len(results['debts'])), results['debts'],
+            years, np.zeros(len(results['debts'])), results['debts'],
             facecolor='r', alpha=0.3)
-        ax.fill_between(years, scipy.zeros(len(results['values'])),
+        ax.fill_between(years, np.zeros(len(results['values'])),
         results['values'], facecolor='b', alpha=0.15)
         ax.fill_between(
-            years, scipy.zeros(len(results['equities'])),
+            years, np.zeros(len(results['equities'])),
             results['equities'], facecolor='g', alpha=0.3)
         ax.legend(loc='upper left')
         ax.set(xlabel='Years', ylabel='Value [$]', title='Equity and debt by month')
@@ -302,19 +392,58 @@ class investment_property:
         Returns:
           * A plot of the capital gains.
         """
-        results, _ = self.calculate_all(additional_monthly_payment)
-        years = [month / 12.0 for month in results['months']]
-        gains = results['equities']
-        cash_flow = self.balance_sheet_.get_cash_flow()
-        one_time_costs = self.balance_sheet_.get_total_one_time_costs()
-        for i in range(len(gains)):
-            gains[i] += float(i * cash_flow)
-            gains[i] -= one_time_costs
+        import matplotlib.pyplot as plt
+        results, _ = self.calculate_schedule(additional_monthly_payment)
+        years = results['months'] / 12.0
+        gains = self.calculate_gains(results)
         fig, ax = plt.subplots(figsize=(10,5))
         ax.plot(years, gains, label='Gains', color='g')
         ax.fill_between(
-            years, scipy.zeros(len(gains)), gains, facecolor='g',
+            years, np.zeros(len(gains)), gains, facecolor='g',
             alpha=0.3)
         ax.set(xlabel='Years', ylabel='Gains [$]', title='Capital gains')
         ax.grid()
         plt.show()
+
+
+class property_plots:
+    """
+    Persistent equity and debt, and capital gains, plots of an investment
+    property for slider-driven redraws. The schedules for every additional
+    monthly payment on the slider are calculated once, so each update only
+    replaces the plotted data.
+    Args:
+      * investment_property: the investment property.
+      * additional_monthly_payments: the additional monthly payments the
+        slider can select.
+      * max_points: optional maximum number of months drawn per line.
+      * blit: whether to redraw only the data, see plotting.confidence_plot.
+    """
+    def __init__(self, investment_property, additional_monthly_payments, max_points=None,
+                 blit=False):
+        self._payments = np.asarray(additional_monthly_payments, dtype=float)
+        self._results, self._years_until_paid_off = investment_property.calculate_schedule(
+            self._payments)
+        self._gains = investment_property.calculate_gains(self._results)
+        self._years = self._results['months'] / 12.0
+        self.equity_and_debt_ = plotting.area_plot(
+            ['Debt', 'Property value', 'Equity'], ['r', 'b', 'g'], [0.3, 0.15, 0.3],
+            'Years', 'Value [$]', 'Equity and debt by month', max_points, blit=blit)
+        self.gains_ = plotting.area_plot(
+            ['Gains'], ['g'], [0.3], 'Years', 'Gains [$]', 'Capital gains', max_points,
+            legend=False, blit=blit)
+
+    def update(self, additional_monthly_payment):
+        """
+        Redraws both plots for the nearest precomputed additional monthly
+        payment.
+        Returns:
+          * the number of years until the property is paid off.
+        """
+        i = np.argmin(np.abs(self._payments - additional_monthly_payment))
+        self.equity_and_debt_.update(self._years, [
+            self._results['debts'][i],
+            self._results['values'][i],
+            self._results['equities'][i]])
+        self.gains_.update(self._years, [self._gains[i]])
+        return float(self._years_until_paid_off[i])
@@ -1,40 +1,81 @@
 import numpy as np
-import matplotlib.pyplot as plt
+
+import analytics
+import instrumentation
+
+
+# Probabilities of the 2 sigma, 1 sigma and median bands.
+CONFIDENCE_PROBS = [0.045, 0.317, 0.5, 0.683, 0.955]
+
+
+def get_quantiles(values, probs, weights=None):
+    """
+    Computes quantiles of the simulated values in every year.
+    Args:
+      values: an array-like with shape (num_simulations, num_years).
+      probs: the list of probabilities.
+      weights: optional sample weights with shape (num_simulations,) or
+        (num_simulations, num_years).
+    Returns:
+      an array with shape (len(probs), num_years).
+    """
+    with instrumentation.stage('plotting.quantiles'):
+        return _get_quantiles(values, probs, weights)
+
+
+def _get_quantiles(values, probs, weights):
+    values = np.asarray(values, dtype=float)
+    probs = np.asarray(probs, dtype=float)
+    num_simulations = values.shape[0]
+    if weights is None:
+        # The quantile is the int(prob * N)-th smallest value, as before, so
+        # one partition along the simulation axis finds all of them. NumPy
+        # selects multiple kth values one at a time, so a full sort is
+        # faster beyond a couple of them.
+        indices = np.minimum((probs * num_simulations).astype(int),
+                             num_simulations - 1)
+        unique_indices = np.unique(indices)
+        if len(unique_indices) > 2:
+            return np.sort(values, axis=0)[indices]
+        partitioned = np.partition(values, unique_indices, axis=0)
+        return partitioned[indices]
+
+    # Weighted quantiles: the smallest value whose cumulative weight exceeds
+    # prob, which matches the unweighted case for equal weights.
+    weights = np.broadcast_to(
+        np.asarray(weights, dtype=float).reshape(num_simulations, -1),
+        values.shape)
+    order = np.argsort(values, axis=0)
+    sorted_values = np.take_along_axis(values, order, axis=0)
+    cdf = np.cumsum(np.take_along_axis(weights, order, axis=0), axis=0)
+    cdf /= cdf[-1]
+    quantiles = np.empty((len(probs), values.shape[1]))
+    for i, prob in enumerate(probs):
+        index = np.minimum(np.sum(cdf <= prob, axis=0), num_simulations - 1)
+        quantiles[i] = np.take_along_axis(sorted_values, index[np.newaxis, :], axis=0)[0]
+    return quantiles
 
 
 def get_confidence_interval(values):
-    num_simulations = len(values)
     # Find the median, 1, and 2 std dev values.
-    probs = [0.045, 0.317, 0.5, 0.683, 0.955]
-    indices = [int(prob * float(num_simulations)) for prob in probs]
-    lower_2s = []
-    lower_1s = []
-    median = []
-    upper_1s = []
-    upper_2s = []
-    for year in range(len(values[0])):
-        yearly_values = [values[sim][year] for sim in range(num_simulations)]
-        yearly_values.sort()
-        lower_2s.append(yearly_values[indices[0]])
-        lower_1s.append(yearly_values[indices[1]])
-        median.append(yearly_values[indices[2]])
-        upper_1s.append(yearly_values[indices[3]])
-        upper_2s.append(yearly_values[indices[4]])
+    lower_2s, lower_1s, median, upper_1s, upper_2s = get_quantiles(
+        values, CONFIDENCE_PROBS)
     return lower_2s, lower_1s, median, upper_1s, upper_2s
 
 
 def get_crossing_dates(values, years, threshold):
-    results = []
-    for v in values:
-        for y in range(len(years)-1):
-            if ((v[y+1] > threshold and v[y] < threshold) or
-                (v[y+1] < threshold and v[y] > threshold)):
-                results.append(years[y])
-                break
-    return results
+    with instrumentation.stage('plotting.crossing_dates'):
+        return _get_crossing_dates(values, years, threshold)
+
+
+def _get_crossing_dates(values, years, threshold):
+    years = np.asarray(years)
+    indices = analytics.get_first_crossing_indices(values, threshold)
+    return years[indices[indices >= 0]].tolist()
 
 
 def plot_ci(x, ys, xlabel, ylabel, title, start_year, end_year):
+    import matplotlib.pyplot as plt
     lower_2s, lower_1s, median, upper_1s, upper_2s = get_confidence_interval(ys)
     fig, ax = plt.subplots(figsize=(10,5))
     years = range(start_year, end_year + 1, 1)
@@ -49,6 +90,7 @@ def plot_ci(x, ys, xlabel, ylabel, title, start_year, end_year):
 
 def plot_two_ci(x, ys1, ys2, label1, label2, xlabel, ylabel, title, start_year, end_year,
                 yrange=None, logy=False):
+    import matplotlib.pyplot as plt
     lower_2s_1, lower_1s_1, median_1, upper_1s_1, upper_2s_1 = get_confidence_interval(ys1)
     lower_2s_2, lower_1s_2, median_2, upper_1s_2, upper_2s_2 = get_confidence_interval(ys2)
     fig, ax = plt.subplots(figsize=(10,5))
@@ -67,3 +109,216 @@ def plot_two_ci(x, ys1, ys2, label1, label2, xlabel, ylabel, title, start_year,
     if logy:
         plt.yscale('log')
     plt.show()
+
+
+def get_downsampled_indices(num_points, max_points=None):
+    """
+    Returns evenly spaced indices of at most max_points points, always
+    including the first and last, or all indices if max_points is None.
+    """
+    if max_points is None or num_points <= max_points:
+        return np.arange(num_points)
+    return np.unique(np.linspace(0, num_points - 1, max_points).round().astype(int))
+
+
+def _get_band_vertices(x, lower, upper):
+    # The outline of a fill_between polygon: along the lower edge and back
+    # along the upper edge.
+    return np.concatenate([np.column_stack([x, lower]),
+                           np.column_stack([x[::-1], upper[::-1]])])
+
+
+def _get_limits(x, ys, yrange, logy, current):
+    """
+    Returns the x and y limits which show the data. The current y limits
+    are kept while the data fits in them and fills at least half of them,
+    so small changes do not move the axes.
+    """
+    xlim = (float(x[0]), float(x[-1]))
+    if yrange:
+        return xlim, tuple(yrange)
+    ys = np.concatenate([np.ravel(y) for y in ys])
+    ys = ys[np.isfinite(ys) & (ys > 0)] if logy else ys[np.isfinite(ys)]
+    if len(ys) == 0:
+        return xlim, None
+    low, high = ys.min(), ys.max()
+    scale = np.log if logy else (lambda value: value)
+    if current is not None and current[0] == xlim and current[1] is not None:
+        current_low, current_high = current[1]
+        if (current_low <= low and high <= current_high and
+                scale(high) - scale(low) >= 0.5 * (scale(current_high) - scale(current_low))):
+            return current
+    if logy:
+        return xlim, (low / 1.5, high * 1.5)
+    margin = 0.05 * (high - low) or 1.0
+    return xlim, (low - margin, high + margin)
+
+
+class _persistent_plot:
+    """
+    The figure, data artists and redrawing shared by confidence_plot and
+    area_plot. With blit, the data artists are animated: a full draw only
+    happens when the limits change, and otherwise the saved background is
+    restored and just the data artists are drawn over it.
+    """
+    def __init__(self, blit, max_points):
+        import matplotlib.pyplot as plt
+        self.fig_, self.ax_ = plt.subplots(figsize=(10,5))
+        self._blit = blit
+        self._max_points = max_points
+        self._artists = []
+        self._limits = None
+        self._background = None
+        if blit:
+            self.fig_.canvas.mpl_connect('draw_event', self._on_draw)
+
+    def _add_artist(self, artist):
+        artist.set_animated(self._blit)
+        self._artists.append(artist)
+        return artist
+
+    def _on_draw(self, event):
+        self._background = self.fig_.canvas.copy_from_bbox(self.fig_.bbox)
+        self._draw_artists()
+
+    def _draw_artists(self):
+        for artist in self._artists:
+            self.ax_.draw_artist(artist)
+        legend = self.ax_.get_legend()
+        if self._blit and legend is not None:
+            self.ax_.draw_artist(legend)
+
+    def _redraw(self, x, ys, yrange=None, logy=False):
+        limits = _get_limits(x, ys, yrange, logy, self._limits)
+        canvas = self.fig_.canvas
+        if limits != self._limits:
+            self._limits = limits
+            self.ax_.set_xlim(limits[0])
+            if limits[1] is not None:
+                self.ax_.set_ylim(limits[1])
+            self._background = None
+        if not self._blit:
+            canvas.draw_idle()
+        elif self._background is None:
+            # The draw event saves the new background and draws the data.
+            canvas.draw()
+        else:
+            canvas.restore_region(self._background)
+            self._draw_artists()
+            canvas.blit(self.fig_.bbox)
+
+
+class confidence_plot(_persistent_plot):
+    """
+    A figure of the median and the 1 and 2 sigma bands of one or more
+    series, which is drawn once and then updated in place, so widget
+    callbacks only replace line and polygon data. Use an interactive
+    backend such as ipympl for the updates to show in a notebook.
+    Args:
+      labels: the label of each series.
+      colors: the color of each series.
+      xlabel, ylabel, title: the axis labels and title.
+      yrange: optional fixed y limits, otherwise they follow the data.
+      logy: whether the y axis is logarithmic.
+      max_points: optional maximum number of points drawn per series, for
+        long monthly horizons.
+      blit: whether to redraw only the data when the limits do not change.
+        Animated artists are left out of saved figures, so this is for
+        interactive backends.
+    """
+    def __init__(self, labels, colors, xlabel, ylabel, title, yrange=None, logy=False,
+                 max_points=None, blit=False):
+        _persistent_plot.__init__(self, blit, max_points)
+        self._yrange = yrange
+        self._logy = logy
+        self._lines = []
+        self._bands = []
+        placeholder = np.ones(1)
+        for label, color in zip(labels, colors):
+            self._bands.append((
+                self._add_artist(self.ax_.fill_between(
+                    placeholder, placeholder, placeholder, facecolor=color, alpha=0.15, label=r'$\pm2\sigma$')),
+                self._add_artist(self.ax_.fill_between(
+                    placeholder, placeholder, placeholder, facecolor=color, alpha=0.35, label=r'$\pm1\sigma$'))))
+            self._lines.append(self._add_artist(
+                self.ax_.plot(placeholder, placeholder, label=label, color=color)[0]))
+        self.ax_.set(xlabel=xlabel, ylabel=ylabel, title=title)
+        if logy:
+            self.ax_.set_yscale('log')
+        self.ax_.legend(loc='best')
+        self.ax_.grid()
+
+    def update(self, x, quantiles_list):
+        """
+        Redraws the series from precomputed quantiles.
+        Args:
+          x: the x values, e.g. the years.
+          quantiles_list: one array per series with shape
+            (len(CONFIDENCE_PROBS), len(x)), as returned by get_quantiles.
+        """
+        with instrumentation.stage('plotting.update'):
+            x = np.asarray(x, dtype=float)
+            indices = get_downsampled_indices(len(x), self._max_points)
+            x = x[indices]
+            quantiles_list = [np.asarray(quantiles)[:, indices] for quantiles in quantiles_list]
+            for line, bands, quantiles in zip(self._lines, self._bands, quantiles_list):
+                lower_2s, lower_1s, median, upper_1s, upper_2s = quantiles
+                line.set_data(x, median)
+                bands[0].set_verts([_get_band_vertices(x, lower_2s, upper_2s)])
+                bands[1].set_verts([_get_band_vertices(x, lower_1s, upper_1s)])
+            self._redraw(x, quantiles_list, self._yrange, self._logy)
+
+    def update_values(self, x, values_list):
+        """
+        Computes the quantiles of simulated values with shape
+        (num_simulations, len(x)) for each series and redraws them.
+        """
+        self.update(x, [get_quantiles(values, CONFIDENCE_PROBS) for values in values_list])
+
+
+class area_plot(_persistent_plot):
+    """
+    A figure of one or more lines, each shaded down to zero, which is drawn
+    once and then updated in place like confidence_plot.
+    Args:
+      labels: the label of each line.
+      colors: the color of each line.
+      alphas: the opacity of the shading under each line.
+      xlabel, ylabel, title: the axis labels and title.
+      max_points: optional maximum number of points drawn per line.
+      legend: whether to show a legend.
+      blit: as for confidence_plot.
+    """
+    def __init__(self, labels, colors, alphas, xlabel, ylabel, title, max_points=None,
+                 legend=True, blit=False):
+        _persistent_plot.__init__(self, blit, max_points)
+        self._lines = []
+        self._areas = []
+        placeholder = np.ones(1)
+        for label, color, alpha in zip(labels, colors, alphas):
+            self._lines.append(self._add_artist(
+                self.ax_.plot(placeholder, placeholder, label=label, color=color)[0]))
+            self._areas.append(self._add_artist(
+                self.ax_.fill_between(placeholder, placeholder, placeholder, facecolor=color, alpha=alpha)))
+        if legend:
+            self.ax_.legend(loc='upper left')
+        self.ax_.set(xlabel=xlabel, ylabel=ylabel, title=title)
+        self.ax_.grid()
+
+    def update(self, x, ys):
+        """
+        Redraws the lines.
+        Args:
+          x: the x values.
+          ys: one array of y values per line, each with the length of x.
+        """
+        with instrumentation.stage('plotting.update'):
+            x = np.asarray(x, dtype=float)
+            indices = get_downsampled_indices(len(x), self._max_points)
+            x = x[indices]
+            ys = [np.asarray(y, dtype=float)[indices] for y in ys]
+            zeros = np.zeros(len(x))
+            for line, area, y in zip(self._lines, self._areas, ys):
+                line.set_data(x, y)
+                area.set_verts([_get_band_vertices(x, zeros, y)])
+            self._redraw(x, ys + [zeros])
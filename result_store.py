@@ -0,0 +1,162 @@
+import json
+import os
+
+import numpy as np
+
+import plotting
+import simulation
+
+# Results are stored year-major, as (num_years + 1, num_simulations), so
+# that a single year or a block of years is contiguous on disk.
+_HEADER_FILE = 'header.json'
+_ARRAY_NAMES = ('values', 'net_incomes')
+
+
+class result_writer:
+    """
+    Writes simulation results to a directory of .npy files one chunk at a
+    time, with a small JSON header.
+    Args:
+      path: the directory to write to.
+      num_simulations: the total number of paths.
+      start_year: the first simulated year.
+      end_year: the year in which the simulation ends.
+      dtype: the dtype on disk, for example np.float32 to halve the size.
+      metadata: a dictionary of extra JSON-serializable header fields, such
+        as the scenario parameters and seed.
+    """
+    def __init__(self, path, num_simulations, start_year, end_year,
+                 dtype=np.float64, metadata=None):
+        os.makedirs(path, exist_ok=True)
+        # The header is only written once the store is closed cleanly, so
+        # remove any header left from an earlier store in this directory.
+        header_path = os.path.join(path, _HEADER_FILE)
+        if os.path.exists(header_path):
+            os.remove(header_path)
+        self._path = path
+        self._num_written = 0
+        self._header = {
+            'num_simulations': num_simulations,
+            'start_year': start_year,
+            'end_year': end_year,
+            'dtype': np.dtype(dtype).name,
+            'layout': 'year_major',
+        }
+        self._header.update(metadata or {})
+        shape = (end_year - start_year + 1, num_simulations)
+        self._arrays = [
+            np.lib.format.open_memmap(
+                os.path.join(path, name + '.npy'), mode='w+', dtype=dtype, shape=shape)
+            for name in _ARRAY_NAMES]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # Leave the store without a header, so an interrupted write
+            # cannot be opened as if it were complete.
+            self._arrays = None
+
+    def append(self, values, net_incomes):
+        """
+        Writes the next chunk of paths, each with shape
+        (chunk_size, num_years + 1).
+        """
+        end = self._num_written + len(values)
+        if end > self._header['num_simulations']:
+            raise ValueError('writing %d paths to a store of %d' %
+                             (end, self._header['num_simulations']))
+        for array, chunk in zip(self._arrays, (values, net_incomes)):
+            array[:, self._num_written:end] = np.asarray(chunk).T
+        self._num_written = end
+
+    def close(self):
+        if self._arrays is None:
+            return
+        for array in self._arrays:
+            array.flush()
+        self._arrays = None
+        self._header['num_written'] = self._num_written
+        with open(os.path.join(self._path, _HEADER_FILE), 'w') as f:
+            json.dump(self._header, f, indent=2)
+
+
+def save_simulation(path,
+                    initial_value,
+                    annual_rate_of_return,
+                    annual_payments,
+                    mortgage,
+                    start_year,
+                    end_year,
+                    num_simulations,
+                    seed=None,
+                    dtype=np.float64,
+                    chunk_size=10000):
+    """
+    Simulates the portfolio in chunks and writes the results to a store,
+    recording the scenario, seed and years in the header. Arguments are as
+    for simulation.simulate_portfolio_arrays.
+    Args:
+      path: the directory to write to.
+      seed: the seed for numpy.random.default_rng.
+      dtype: the dtype on disk.
+      chunk_size: the number of paths simulated and written at once.
+    """
+    metadata = {
+        'seed': seed,
+        'scenario': simulation.describe_inputs({
+            'initial_value': initial_value,
+            'annual_rate_of_return': annual_rate_of_return,
+            'annual_payments': annual_payments,
+            'mortgage': mortgage,
+        }),
+    }
+    with result_writer(path, num_simulations, start_year, end_year,
+                       dtype=dtype, metadata=metadata) as writer:
+        for values, net_incomes in simulation.simulate_portfolio_chunks(
+                initial_value,
+                annual_rate_of_return,
+                annual_payments,
+                mortgage,
+                start_year,
+                end_year,
+                num_simulations,
+                chunk_size=chunk_size,
+                rng=np.random.default_rng(seed)):
+            writer.append(values, net_incomes)
+
+
+def open_results(path):
+    """
+    Opens a store without reading the arrays into memory. Only the paths
+    which were written are returned.
+    Returns:
+      values and net incomes as read-only memory-mapped views with shape
+      (num_written, num_years + 1), and the header dictionary.
+    """
+    header_path = os.path.join(path, _HEADER_FILE)
+    if not os.path.exists(header_path):
+        raise ValueError('%s has no header, the write did not complete' % path)
+    with open(header_path) as f:
+        header = json.load(f)
+    num_written = header['num_written']
+    values, net_incomes = [
+        np.load(os.path.join(path, name + '.npy'), mmap_mode='r')[:, :num_written].T
+        for name in _ARRAY_NAMES]
+    return values, net_incomes, header
+
+
+def get_quantiles(values, probs, years_per_chunk=8):
+    """
+    Computes per-year quantiles like plotting.get_quantiles, reading only
+    years_per_chunk years of a memory-mapped store into memory at a time.
+    Returns:
+      an array with shape (len(probs), num_years).
+    """
+    num_columns = values.shape[1]
+    return np.concatenate([
+        plotting.get_quantiles(np.asarray(values[:, year:year + years_per_chunk]), probs)
+        for year in range(0, num_columns, years_per_chunk)], axis=1)
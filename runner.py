@@ -0,0 +1,224 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import analytics
+import plotting
+import simulation
+import streaming
+
+
+def _run_shard(args):
+    (initial_value, annual_rate_of_return, annual_payments, mortgage,
+     start_year, end_year, num_simulations, seed_sequence, summarize,
+     thresholds, compression) = args
+    rng = np.random.default_rng(seed_sequence)
+    if summarize:
+        return streaming.summarize_portfolio(
+            initial_value,
+            annual_rate_of_return,
+            annual_payments,
+            mortgage,
+            start_year,
+            end_year,
+            num_simulations,
+            thresholds=thresholds,
+            chunk_size=max(num_simulations, 1),
+            compression=compression,
+            rng=rng)
+    return simulation.simulate_portfolio_arrays(
+        initial_value,
+        annual_rate_of_return,
+        annual_payments,
+        mortgage,
+        start_year,
+        end_year,
+        num_simulations,
+        rng=rng)
+
+
+def simulate_portfolio_sharded(initial_value,
+                               annual_rate_of_return,
+                               annual_payments,
+                               mortgage,
+                               start_year,
+                               end_year,
+                               num_simulations,
+                               seed=None,
+                               num_workers=None,
+                               shard_size=10000,
+                               summarize=False,
+                               thresholds=(),
+                               compression=200):
+    """
+    Splits the simulations into shards of shard_size paths and runs them over
+    a process pool. Each shard draws from its own stream spawned from
+    numpy.random.SeedSequence(seed), and the shards are merged in order, so
+    the results for a given seed and shard_size do not depend on num_workers.
+    Arguments are as for simulation.simulate_portfolio_arrays.
+    Args:
+      seed: the seed for the simulation, or None for a fresh random seed.
+      num_workers: the number of processes, or None for one per core. With
+        one worker the shards run in this process.
+      shard_size: the number of paths in each shard.
+      summarize: if True, return streaming.simulation_summary objects
+        instead of the full arrays.
+      thresholds: the thresholds for the crossing histograms when summarizing.
+      compression: the accuracy parameter of the quantile sketches.
+    Returns:
+      values and net incomes, as arrays with shape
+      (num_simulations, num_years + 1) or as simulation summaries.
+    """
+    if not isinstance(annual_payments, simulation.payment_schedule):
+        annual_payments = simulation.payment_schedule(annual_payments, start_year, end_year)
+    shard_sizes = [min(shard_size, num_simulations - shard_start)
+                   for shard_start in range(0, num_simulations, shard_size)] or [0]
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(shard_sizes))
+    shards = [(initial_value, annual_rate_of_return, annual_payments, mortgage,
+               start_year, end_year, size, seed_sequence, summarize,
+               tuple(thresholds), compression)
+              for size, seed_sequence in zip(shard_sizes, seed_sequences)]
+
+    if num_workers == 1 or len(shards) <= 1:
+        results = [_run_shard(shard) for shard in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            results = list(executor.map(_run_shard, shards))
+
+    # Merge the shards in order.
+    if summarize:
+        num_columns = end_year - start_year + 1
+        values = streaming.simulation_summary(start_year, num_columns, thresholds, compression)
+        net_incomes = streaming.simulation_summary(start_year, num_columns, (), compression)
+        for shard_values, shard_net_incomes in results:
+            values.merge(shard_values)
+            net_incomes.merge(shard_net_incomes)
+        return values, net_incomes
+    return (np.concatenate([r[0] for r in results]),
+            np.concatenate([r[1] for r in results]))
+
+
+def _get_precision(values, probs, threshold, relative, num_bootstrap, rng):
+    """
+    Estimates the standard error of the chosen statistics and returns the
+    largest one: the per-year quantiles, or the mean crossing year if a
+    threshold is given, which is inf when too few paths cross the threshold
+    to estimate it. Quantile errors use the bootstrap if num_bootstrap
+    is given, and otherwise the spread of the order statistics one binomial
+    standard deviation either side of each quantile.
+    """
+    num_simulations = len(values)
+    if threshold is not None:
+        indices = analytics.get_first_crossing_indices(values, threshold)
+        estimates = []
+        for _ in range(num_bootstrap or 50):
+            resampled = indices[rng.integers(0, num_simulations, num_simulations)]
+            crossed = resampled[resampled >= 0]
+            if len(crossed) == 0:
+                # The mean crossing year is undefined, so no precision is
+                # reached.
+                return np.inf
+            estimates.append(crossed.mean())
+        # The spread of the mean crossing year, in years.
+        return float(np.std(estimates, ddof=1))
+
+    probs = np.asarray(probs, dtype=float)
+    if num_bootstrap:
+        estimates = np.array([
+            plotting.get_quantiles(
+                values[rng.integers(0, num_simulations, num_simulations)], probs)
+            for _ in range(num_bootstrap)])
+        errors = estimates.std(axis=0, ddof=1)
+    else:
+        spread = np.sqrt(num_simulations * probs * (1.0 - probs)) / num_simulations
+        lower = plotting.get_quantiles(values, np.clip(probs - spread, 0.0, 1.0))
+        upper = plotting.get_quantiles(values, np.clip(probs + spread, 0.0, 1.0))
+        errors = 0.5 * (upper - lower)
+    if relative:
+        # Relative to the largest quantile in each year, so that quantiles
+        # near zero do not dominate.
+        scale = np.abs(plotting.get_quantiles(values, probs)).max(axis=0)
+        errors = np.divide(errors, scale, out=np.zeros_like(errors), where=scale > 0)
+    return float(errors.max())
+
+
+def simulate_portfolio_adaptive(initial_value,
+                                annual_rate_of_return,
+                                annual_payments,
+                                mortgage,
+                                start_year,
+                                end_year,
+                                tolerance,
+                                probs=plotting.CONFIDENCE_PROBS,
+                                threshold=None,
+                                relative=True,
+                                min_simulations=1000,
+                                max_simulations=100000,
+                                batch_size=1000,
+                                num_bootstrap=None,
+                                seed=None):
+    """
+    Simulates the portfolio in batches until the standard error of the
+    chosen statistic is within tolerance, or max_simulations is reached.
+    Arguments are as for simulation.simulate_portfolio_arrays.
+    Args:
+      tolerance: the target standard error.
+      probs: the per-year quantiles whose standard error is checked.
+      threshold: if given, check the mean first year at which the values
+        cross this threshold instead of the quantiles.
+      relative: if True, the quantile standard errors are relative to the
+        quantiles. Ignored for the crossing year, which is in years.
+      min_simulations: the number of paths to run before the first check.
+      max_simulations: the maximum number of paths.
+      batch_size: the smallest number of paths added between checks. Later
+        batches add half the paths simulated so far, so the number of checks
+        grows only logarithmically with the number of paths.
+      num_bootstrap: the number of bootstrap resamples, or None to estimate
+        quantile errors from the order statistics, which is much faster.
+        The crossing year is always bootstrapped, with 50 resamples by
+        default.
+      seed: the seed for the simulation and the bootstrap.
+    Returns:
+      values and net incomes, each with shape
+      (num_simulations, num_years + 1), the achieved precision, and the
+      number of paths used. The precision is inf if the threshold is
+      crossed too rarely to estimate the mean crossing year.
+    """
+    simulation_seed, bootstrap_seed = np.random.SeedSequence(seed).spawn(2)
+    rng = np.random.default_rng(simulation_seed)
+    bootstrap_rng = np.random.default_rng(bootstrap_seed)
+    if not isinstance(annual_payments, simulation.payment_schedule):
+        annual_payments = simulation.payment_schedule(annual_payments, start_year, end_year)
+
+    all_values = []
+    all_net_incomes = []
+    num_simulations = 0
+    precision = np.inf
+    while num_simulations < max_simulations:
+        size = min(max(batch_size, num_simulations // 2, min_simulations - num_simulations),
+                   max_simulations - num_simulations)
+        values, net_incomes = simulation.simulate_portfolio_arrays(
+            initial_value,
+            annual_rate_of_return,
+            annual_payments,
+            mortgage,
+            start_year,
+            end_year,
+            size,
+            rng=rng)
+        all_values.append(values)
+        all_net_incomes.append(net_incomes)
+        num_simulations += size
+
+        # Check the precision of everything simulated so far.
+        values = np.concatenate(all_values)
+        all_values = [values]
+        precision = _get_precision(
+            values, probs, threshold, relative, num_bootstrap, bootstrap_rng)
+        if precision <= tolerance:
+            break
+
+    return (np.concatenate(all_values),
+            np.concatenate(all_net_incomes),
+            precision,
+            num_simulations)
@@ -1,5 +1,11 @@
+import collections
+import hashlib
+import os
+
 import numpy as np
 
+import instrumentation
+
 
 class simulated_parameter:
 
@@ -16,6 +22,36 @@ class simulated_parameter:
             scale=self._parameter_stddev,
             size=1)[0]
 
+    def get_simulated_values(self, size, rng=None):
+        """
+        Draws an array of simulated values of the given shape. If rng is None,
+        the global numpy random state is used.
+        """
+        rng = np.random if rng is None else rng
+        return rng.normal(
+            loc=self._parameter_mean,
+            scale=self._parameter_stddev,
+            size=size)
+
+    def get_monthly_values(self, size, rng=None):
+        """
+        Draws monthly growth factors whose product over a year has about the
+        same mean and variance as one annual draw. If rng is None, the global
+        numpy random state is used.
+        """
+        rng = np.random if rng is None else rng
+        monthly_mean = self._parameter_mean**(1.0 / 12.0)
+        # Match the annual variance of a product of 12 independent factors.
+        monthly_second_moment = (self._parameter_stddev**2 + self._parameter_mean**2)**(1.0 / 12.0)
+        monthly_stddev = np.sqrt(max(monthly_second_moment - monthly_mean**2, 0.0))
+        return rng.normal(loc=monthly_mean, scale=monthly_stddev, size=size)
+
+    def get_values_from_shocks(self, shocks):
+        """
+        Converts standard normal shocks into simulated values.
+        """
+        return self._parameter_mean + self._parameter_stddev * shocks
+
     def get_param_name(self):
         return self._parameter_name
 
@@ -58,6 +94,357 @@ class recurring_payment:
         self._annual_sum = self._initial_sum
 
 
+class payment_schedule:
+    """
+    Holds a list of recurring payments as arrays, with the mean payment of
+    every payment in every year computed once.
+    Args:
+      payments: the list of recurring_payments.
+      start_year: the first simulated year.
+      end_year: the year in which the simulation ends.
+    """
+    def __init__(self, payments, start_year, end_year):
+        self._names = [p._name for p in payments]
+        self._initial_sums = np.array([p._initial_sum for p in payments], dtype=float)
+        self._annual_changes = np.array([p._annual_change for p in payments], dtype=float)
+        self._payment_stdevs = np.array([p._payment_stdev for p in payments], dtype=float)
+        self._start_years = np.array([p._start_year for p in payments], dtype=int)
+        self._end_years = np.array([p._end_year for p in payments], dtype=int)
+        self._start_year = start_year
+        self._end_year = end_year
+
+        # Payments grow every year from the start of the simulation, whether
+        # or not they are active yet, just like recurring_payment.update_payment.
+        years = np.arange(start_year, end_year)
+        growth = np.power(self._annual_changes[:, np.newaxis],
+                          (years - start_year)[np.newaxis, :])
+        active = ((years[np.newaxis, :] >= self._start_years[:, np.newaxis]) &
+                  (years[np.newaxis, :] < self._end_years[:, np.newaxis]))
+        self._means = np.where(active, self._initial_sums[:, np.newaxis] * growth, 0.0)
+        self._stddevs = np.abs(self._means * self._payment_stdevs[:, np.newaxis])
+
+        # The payments are independent, so their sum in each year is normal
+        # with the summed mean and variance.
+        self._mean_income = self._means.sum(axis=0)
+        self._income_stddev = np.sqrt(np.sum(self._stddevs**2, axis=0))
+
+    def get_names(self):
+        return self._names
+
+    def get_years(self):
+        return self._start_year, self._end_year
+
+    def get_mean_matrix(self):
+        """
+        Returns the mean payments with shape (num_payments, num_years).
+        """
+        return self._means
+
+    def get_stddev_matrix(self):
+        """
+        Returns the payment stddevs with shape (num_payments, num_years).
+        """
+        return self._stddevs
+
+    def get_mean_income(self):
+        return self._mean_income
+
+    def get_income_stddev(self):
+        return self._income_stddev
+
+    def simulate_incomes(self, num_simulations, rng=None):
+        """
+        Draws the total payment for every simulation and year at once.
+        Returns:
+          an array with shape (num_simulations, num_years).
+        """
+        rng = np.random if rng is None else rng
+        return self.get_incomes_from_shocks(
+            rng.standard_normal((num_simulations, len(self._mean_income))))
+
+    def get_incomes_from_shocks(self, shocks):
+        """
+        Converts standard normal shocks with shape (num_simulations,
+        num_years) into total payments.
+        """
+        return self._mean_income + shocks * self._income_stddev
+
+
+SAMPLING_MODES = ('mc', 'antithetic', 'sobol')
+
+
+def draw_standard_normals(shape, sampling='mc', rng=None, num_replicates=8):
+    """
+    Draws standard normal shocks with the given shape, where the first axis
+    is the simulation.
+    Args:
+      shape: the shape of the shocks, (num_simulations, ...).
+      sampling: one of SAMPLING_MODES.
+        * 'mc': independent pseudo-random draws.
+        * 'antithetic': the second half of the simulations are the negated
+          shocks of the first half.
+        * 'sobol': scrambled Sobol points mapped through the inverse normal
+          CDF, in num_replicates independently scrambled blocks. Each block
+          is a prefix of a power of two points, so blocks with a power of
+          two simulations are fully balanced.
+      rng: a numpy Generator, or None to use the global numpy random state.
+      num_replicates: the number of scrambled blocks for 'sobol'.
+    Returns:
+      an array of standard normal shocks.
+    """
+    num_simulations = shape[0]
+    if sampling == 'mc':
+        rng = np.random if rng is None else rng
+        return rng.standard_normal(shape)
+    if sampling == 'antithetic':
+        rng = np.random if rng is None else rng
+        half = rng.standard_normal(((num_simulations + 1) // 2,) + tuple(shape[1:]))
+        return np.concatenate([half, -half])[:num_simulations]
+    if sampling == 'sobol':
+        from scipy.special import ndtri
+        from scipy.stats import qmc
+        if rng is None:
+            # Seed the scrambling from the global state, so that
+            # np.random.seed makes Sobol runs reproducible like other modes.
+            rng = np.random.default_rng(np.random.randint(2**32, dtype=np.uint32))
+        dimension = int(np.prod(shape[1:], dtype=int))
+        # The blocks match np.array_split, as get_standard_error expects.
+        # Drawing a power of two points and keeping the prefix avoids the
+        # unbalanced Sobol.random sizes.
+        blocks = [qmc.Sobol(dimension, scramble=True, seed=rng).random_base2(
+                      int(np.ceil(np.log2(len(block)))))[:len(block)]
+                  for block in np.array_split(np.arange(num_simulations), num_replicates)
+                  if len(block) > 0]
+        points = np.concatenate(blocks) if blocks else np.empty((0, dimension))
+        # Keep the points strictly inside (0, 1) so the shocks are finite.
+        points = np.clip(points, 1e-12, 1.0 - 1e-12)
+        return ndtri(points).reshape(shape)
+    raise ValueError('unknown sampling mode %r, expected one of %s' %
+                     (sampling, SAMPLING_MODES))
+
+
+def get_standard_error(values, sampling='mc', num_replicates=8):
+    """
+    Estimates the standard error of the mean of the values in every year,
+    taking the sampling mode into account. For common random numbers, pass
+    the difference of the two scenarios' values.
+    Args:
+      values: an array with shape (num_simulations, num_years).
+      sampling: the sampling mode used to draw the values.
+      num_replicates: the number of scrambled blocks used for 'sobol'.
+    Returns:
+      an array with shape (num_years,).
+    """
+    values = np.asarray(values, dtype=float)
+    if sampling == 'mc':
+        samples = values
+    elif sampling == 'antithetic':
+        # Each antithetic pair is one independent sample. Row i is paired
+        # with row i + half as in draw_standard_normals, and for an odd
+        # number of simulations the middle row has no pair and is left out.
+        half = (len(values) + 1) // 2
+        samples = 0.5 * (values[:len(values) - half] + values[half:])
+    elif sampling == 'sobol':
+        # The scrambled blocks are independent, but points within a block
+        # are not.
+        samples = np.array([block.mean(axis=0)
+                            for block in np.array_split(values, num_replicates)
+                            if len(block) > 0])
+    else:
+        raise ValueError('unknown sampling mode %r, expected one of %s' %
+                         (sampling, SAMPLING_MODES))
+    return samples.std(axis=0, ddof=1) / np.sqrt(len(samples))
+
+
+def get_mortgage_payments(mortgage, start_year, end_year):
+    """
+    Returns the annual mortgage payment in each year from start_year to
+    end_year, which is zero outside the mortgage term.
+    """
+    years = np.arange(start_year, end_year)
+    active = ((years >= mortgage.start_year_) &
+              (years < mortgage.start_year_ + mortgage.mortgage_term_years_))
+    return np.where(active, mortgage.get_annual_payment(), 0.0)
+
+
+def check_shock_support(annual_rate_of_return):
+    """
+    Raises a ValueError if the rate of return cannot be sampled from
+    standard normal shocks, for example a historical.historical_return.
+    """
+    if not hasattr(annual_rate_of_return, 'get_values_from_shocks'):
+        raise ValueError('%s does not support sampling from shocks' %
+                         type(annual_rate_of_return).__name__)
+
+
+def advance_values(initial_value, rors, new_incomes):
+    """
+    Advances every path one year at a time. Assets only grow while positive.
+    Args:
+      initial_value: the value of the assets in the first year.
+      rors: the rates of return with shape (..., num_years).
+      new_incomes: the net incomes, broadcastable to the shape of rors.
+    Returns:
+      the values with shape (..., num_years + 1). The array is stored with
+      the year axis outermost, so np.moveaxis(values, -1, 0) is contiguous.
+    """
+    shape = np.broadcast_shapes(np.shape(rors), np.shape(new_incomes))
+    # Work year-major so that every step reads and writes contiguous memory.
+    rors = np.ascontiguousarray(np.moveaxis(np.asarray(rors), -1, 0))
+    new_incomes = np.ascontiguousarray(np.moveaxis(np.asarray(new_incomes), -1, 0))
+    values = np.empty((shape[-1] + 1,) + shape[:-1])
+    values[0] = initial_value
+    for i in range(shape[-1]):
+        curr_values = values[i]
+        next_values = values[i + 1]
+        np.multiply(curr_values, rors[i], out=next_values)
+        np.copyto(next_values, curr_values, where=curr_values <= 0)
+        next_values += new_incomes[i]
+    return np.moveaxis(values, 0, -1)
+
+
+def simulate_portfolio_arrays(initial_value,
+                              annual_rate_of_return,
+                              annual_payments,
+                              mortgage,
+                              start_year,
+                              end_year,
+                              num_simulations,
+                              rng=None,
+                              sampling='mc',
+                              shocks=None):
+    """
+    Simulates all paths of the portfolio at once.
+    Args:
+      initial_value: the value of the assets in the start year.
+      annual_rate_of_return: the simulated_parameter for the annual rate of
+        return, or another return model such as assets.multi_asset_return.
+      annual_payments: the list of recurring_payments, or a payment_schedule.
+      mortgage: the mortgage, or None.
+      start_year: the first simulated year.
+      end_year: the year in which the simulation ends.
+      num_simulations: the number of simulated paths.
+      rng: a numpy Generator, or None to use the global numpy random state.
+      sampling: one of SAMPLING_MODES, see draw_standard_normals.
+      shocks: optional standard normal shocks with shape
+        (num_simulations, 2, num_years) for the rates of return and the
+        payments. Passing the same shocks to several scenarios gives common
+        random numbers.
+    Returns:
+      values and net incomes, each with shape (num_simulations, num_years + 1).
+    """
+    num_years = end_year - start_year
+
+    # Build the payment schedule once for all simulations.
+    if isinstance(annual_payments, payment_schedule):
+        schedule = annual_payments
+        if schedule.get_years() != (start_year, end_year):
+            raise ValueError('payment_schedule years %s do not match (%d, %d)' %
+                             (schedule.get_years(), start_year, end_year))
+    else:
+        with instrumentation.stage('simulation.payment_schedule'):
+            schedule = payment_schedule(annual_payments, start_year, end_year)
+
+    # Draw the payments and rates of return for all simulations and years
+    # at once.
+    with instrumentation.stage('simulation.rng'):
+        if shocks is not None or sampling != 'mc':
+            # Check before drawing any shocks.
+            check_shock_support(annual_rate_of_return)
+        if shocks is None and sampling != 'mc':
+            shocks = draw_standard_normals(
+                (num_simulations, 2, num_years), sampling=sampling, rng=rng)
+        if shocks is None:
+            new_incomes = schedule.simulate_incomes(num_simulations, rng=rng)
+            rors = annual_rate_of_return.get_simulated_values(
+                (num_simulations, num_years), rng=rng)
+            instrumentation.count('simulation.rng_draws', 2 * num_simulations * num_years)
+        else:
+            new_incomes = schedule.get_incomes_from_shocks(shocks[:, 1])
+            rors = annual_rate_of_return.get_values_from_shocks(shocks[:, 0])
+            instrumentation.count('simulation.rng_draws', shocks.size)
+
+    # Subtract the mortgage payment in the years the mortgage is active.
+    if mortgage is not None:
+        with instrumentation.stage('simulation.mortgage'):
+            new_incomes -= get_mortgage_payments(mortgage, start_year, end_year)
+
+    with instrumentation.stage('simulation.recursion'):
+        values = advance_values(initial_value, rors, new_incomes)
+
+        # The first year's income is repeated so that incomes line up with values.
+        net_incomes = np.concatenate([new_incomes[:, :1], new_incomes], axis=1)
+    instrumentation.count('simulation.paths', num_simulations)
+    instrumentation.record_bytes('simulation.results', values, net_incomes)
+    return values, net_incomes
+
+
+def simulate_portfolio_chunks(initial_value,
+                              annual_rate_of_return,
+                              annual_payments,
+                              mortgage,
+                              start_year,
+                              end_year,
+                              num_simulations,
+                              chunk_size=10000,
+                              rng=None):
+    """
+    Simulates the portfolio in chunks of at most chunk_size paths, so memory
+    stays bounded however many simulations are requested. Arguments are as
+    for simulate_portfolio_arrays.
+    Yields:
+      values and net incomes for each chunk, each with shape
+      (chunk_size, num_years + 1).
+    """
+    if not isinstance(annual_payments, payment_schedule):
+        annual_payments = payment_schedule(annual_payments, start_year, end_year)
+    for chunk_start in range(0, num_simulations, chunk_size):
+        yield simulate_portfolio_arrays(
+            initial_value,
+            annual_rate_of_return,
+            annual_payments,
+            mortgage,
+            start_year,
+            end_year,
+            min(chunk_size, num_simulations - chunk_start),
+            rng=rng)
+
+
+def simulate_scenarios(scenarios,
+                       start_year,
+                       end_year,
+                       num_simulations,
+                       rng=None,
+                       sampling='mc'):
+    """
+    Simulates several scenarios with common random numbers, so that every
+    scenario sees the same market and payment shocks and the differences
+    between them are much less noisy.
+    Args:
+      scenarios: a list of (initial_value, annual_rate_of_return,
+        annual_payments, mortgage) tuples.
+      start_year: the first simulated year.
+      end_year: the year in which the simulation ends.
+      num_simulations: the number of simulated paths.
+      rng: a numpy Generator, or None to use the global numpy random state.
+      sampling: one of SAMPLING_MODES, see draw_standard_normals.
+    Returns:
+      a list of (values, net incomes) tuples, one per scenario.
+    """
+    shocks = draw_standard_normals(
+        (num_simulations, 2, end_year - start_year), sampling=sampling, rng=rng)
+    return [simulate_portfolio_arrays(
+                initial_value,
+                annual_rate_of_return,
+                annual_payments,
+                mortgage,
+                start_year,
+                end_year,
+                num_simulations,
+                shocks=shocks)
+            for initial_value, annual_rate_of_return, annual_payments, mortgage in scenarios]
+
+
 def simulate_portfolio(initial_value,
                        annual_rate_of_return,
                        annual_payments,
@@ -65,55 +452,369 @@ def simulate_portfolio(initial_value,
                        start_year,
                        end_year,
                        num_simulations):
-    # Store the values and incomes for each simulation and each year.
-    values = []
-    net_incomes = []
-
-    # Loop over the number of simulations.
-    for _ in range(num_simulations):
-
-        curr_payments = annual_payments
-        for p in curr_payments:
-            p.reset()
-
-        # Store the values and incomes for all years in this simulation.
-        curr_values = [initial_value]
-        curr_net_incomes = []
-
-        # Loop over years.
-        for year in range(start_year, end_year, 1):
-            
-            # Calculate current values.
-            new_income = 0
-            for p in curr_payments:
-                new_income += p.simulate_payment(year)
-                # Update payment value.
-                p.update_payment()
-
-            # Add mortgage payment to payments.
-            if (mortgage is None or year < mortgage.start_year_ or
-                year >= mortgage.start_year_ + mortgage.mortgage_term_years_):
-                mortgage_payment = 0.0
-            else:
-                mortgage_payment = mortgage.get_annual_payment()
-            new_income -= mortgage_payment
-
-            # Update value of assets.
-            ror = annual_rate_of_return.get_simulated_value()
-
-            if curr_values[-1] > 0:
-                new_value = (curr_values[-1] * ror) + new_income
-            else:
-                new_value = curr_values[-1] + new_income
-
-            # Update the incomes and values for one year in one simulation.
-            if len(curr_net_incomes) == 0:
-                curr_net_incomes.append(new_income)
-            curr_net_incomes.append(new_income)
-            curr_values.append(new_value)
-
-        # Update the set of all incomes and values.
-        net_incomes.append(curr_net_incomes)
-        values.append(curr_values)
-            
-    return values, net_incomes
\ No newline at end of file
+    """
+    Simulates the portfolio and returns the values and net incomes as lists of
+    lists, one list per simulation. See simulate_portfolio_arrays.
+    """
+    values, net_incomes = simulate_portfolio_arrays(
+        initial_value,
+        annual_rate_of_return,
+        annual_payments,
+        mortgage,
+        start_year,
+        end_year,
+        num_simulations)
+    return values.tolist(), net_incomes.tolist()
+
+
+class simulation_state:
+    """
+    The random shocks and per-payment contributions of a simulation, kept so
+    that changing one payment, the mortgage or the rate of return only
+    recomputes what changed. Create with simulate_portfolio_incremental.
+    This holds two (num_payments, num_simulations, num_years) arrays, so it
+    is meant for interactive runs rather than very large ones.
+    """
+    def __init__(self, initial_value, annual_rate_of_return, annual_payments,
+                 mortgage, start_year, end_year, num_simulations, rng):
+        check_shock_support(annual_rate_of_return)
+        num_years = end_year - start_year
+        self._initial_value = initial_value
+        self._annual_rate_of_return = annual_rate_of_return
+        self._payments = list(annual_payments)
+        self._mortgage = mortgage
+        self._start_year = start_year
+        self._end_year = end_year
+        self._num_simulations = num_simulations
+        self._rng = np.random if rng is None else rng
+
+        with instrumentation.stage('simulation.rng'):
+            self._return_shocks = self._rng.standard_normal((num_simulations, num_years))
+            self._payment_shocks = self._rng.standard_normal(
+                (len(self._payments), num_simulations, num_years))
+        self._rors = annual_rate_of_return.get_values_from_shocks(self._return_shocks)
+        self._means, self._stddevs = self._get_moments(self._payments)
+        self._contributions = (self._means[:, np.newaxis, :] +
+                               self._stddevs[:, np.newaxis, :] * self._payment_shocks)
+        self._mortgage_payments = self._get_mortgage_payments(mortgage)
+        self._new_incomes = self._contributions.sum(axis=0) - self._mortgage_payments
+        with instrumentation.stage('simulation.recursion'):
+            self._values = np.ascontiguousarray(
+                advance_values(initial_value, self._rors, self._new_incomes))
+
+    def get_results(self):
+        """
+        Returns the values and net incomes, each with shape
+        (num_simulations, num_years + 1), as for simulate_portfolio_arrays.
+        """
+        net_incomes = np.concatenate([self._new_incomes[:, :1], self._new_incomes], axis=1)
+        return self._values.copy(), net_incomes
+
+    def get_payments(self):
+        return list(self._payments)
+
+    def update_payment(self, index, payment):
+        """
+        Replaces the payment at index and recomputes the portfolio from the
+        first year in which the payment's mean or stddev changed.
+        """
+        means, stddevs = self._get_moments([payment])
+        changed = (means[0] != self._means[index]) | (stddevs[0] != self._stddevs[index])
+        self._payments[index] = payment
+        self._means[index] = means[0]
+        self._stddevs[index] = stddevs[0]
+        if not changed.any():
+            return
+        first_year = int(np.argmax(changed))
+        contribution = (means[0, first_year:] +
+                        stddevs[0, first_year:] * self._payment_shocks[index, :, first_year:])
+        self._new_incomes[:, first_year:] += contribution - self._contributions[index, :, first_year:]
+        self._contributions[index, :, first_year:] = contribution
+        self._advance_from(first_year)
+
+    def add_payment(self, payment):
+        """
+        Adds a payment with newly drawn shocks.
+        """
+        means, stddevs = self._get_moments([payment])
+        shocks = self._rng.standard_normal((1,) + self._return_shocks.shape)
+        contribution = means[:, np.newaxis, :] + stddevs[:, np.newaxis, :] * shocks
+        self._payments.append(payment)
+        self._means = np.concatenate([self._means, means])
+        self._stddevs = np.concatenate([self._stddevs, stddevs])
+        self._payment_shocks = np.concatenate([self._payment_shocks, shocks])
+        self._contributions = np.concatenate([self._contributions, contribution])
+        self._new_incomes += contribution[0]
+        self._advance_from(self._get_first_active_year(means[0], stddevs[0]))
+
+    def remove_payment(self, index):
+        """
+        Removes the payment at index.
+        """
+        first_year = self._get_first_active_year(self._means[index], self._stddevs[index])
+        self._new_incomes -= self._contributions[index]
+        del self._payments[index]
+        self._means = np.delete(self._means, index, axis=0)
+        self._stddevs = np.delete(self._stddevs, index, axis=0)
+        self._payment_shocks = np.delete(self._payment_shocks, index, axis=0)
+        self._contributions = np.delete(self._contributions, index, axis=0)
+        self._advance_from(first_year)
+
+    def update_mortgage(self, mortgage):
+        """
+        Replaces the mortgage, or removes it if None, and recomputes the
+        portfolio from the first year in which the payment changed.
+        """
+        mortgage_payments = self._get_mortgage_payments(mortgage)
+        changed = mortgage_payments != self._mortgage_payments
+        self._mortgage = mortgage
+        if not changed.any():
+            return
+        self._new_incomes -= mortgage_payments - self._mortgage_payments
+        self._mortgage_payments = mortgage_payments
+        self._advance_from(int(np.argmax(changed)))
+
+    def update_rate_of_return(self, annual_rate_of_return):
+        """
+        Replaces the rate of return, reusing the same shocks, and recomputes
+        every year.
+        """
+        check_shock_support(annual_rate_of_return)
+        self._annual_rate_of_return = annual_rate_of_return
+        self._rors = annual_rate_of_return.get_values_from_shocks(self._return_shocks)
+        self._advance_from(0)
+
+    def _get_moments(self, payments):
+        schedule = payment_schedule(payments, self._start_year, self._end_year)
+        return schedule.get_mean_matrix(), schedule.get_stddev_matrix()
+
+    def _get_mortgage_payments(self, mortgage):
+        if mortgage is None:
+            return np.zeros(self._end_year - self._start_year)
+        return get_mortgage_payments(mortgage, self._start_year, self._end_year)
+
+    def _get_first_active_year(self, means, stddevs):
+        active = (means != 0) | (stddevs != 0)
+        return int(np.argmax(active)) if active.any() else len(means)
+
+    def _advance_from(self, first_year):
+        """
+        Recomputes the values after first_year from the values in that year.
+        """
+        if first_year >= len(self._rors[0]):
+            return
+        with instrumentation.stage('simulation.recursion'):
+            self._values[:, first_year + 1:] = advance_values(
+                self._values[:, first_year],
+                self._rors[:, first_year:],
+                self._new_incomes[:, first_year:])[:, 1:]
+
+
+def simulate_portfolio_incremental(initial_value,
+                                   annual_rate_of_return,
+                                   annual_payments,
+                                   mortgage,
+                                   start_year,
+                                   end_year,
+                                   num_simulations,
+                                   rng=None):
+    """
+    Simulates the portfolio like simulate_portfolio_arrays, but keeps the
+    random shocks and each payment's contribution so that later changes can
+    be applied incrementally. Each payment has its own shocks here, so the
+    draws differ from simulate_portfolio_arrays for the same seed.
+    Returns:
+      a simulation_state. Use get_results() for the values and net incomes,
+      and update_payment(), add_payment(), remove_payment(),
+      update_mortgage() and update_rate_of_return() to change the scenario.
+    """
+    return simulation_state(initial_value, annual_rate_of_return, annual_payments,
+                            mortgage, start_year, end_year, num_simulations, rng)
+
+
+def describe_inputs(obj):
+    """
+    Converts an object into nested lists of plain values with a stable repr,
+    for hashing or recording simulation inputs. Arrays are replaced by their
+    dtype, shape and hash.
+    """
+    if isinstance(obj, np.ndarray):
+        return ['ndarray', str(obj.dtype), list(obj.shape),
+                hashlib.sha256(np.ascontiguousarray(obj).tobytes()).hexdigest()]
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+    if isinstance(obj, (list, tuple, range)):
+        return [describe_inputs(item) for item in obj]
+    if isinstance(obj, dict):
+        return [[str(key), describe_inputs(value)]
+                for key, value in sorted(obj.items(), key=lambda item: str(item[0]))]
+    return [type(obj).__name__, describe_inputs(vars(obj))]
+
+
+def get_scenario_key(*objects):
+    """
+    Returns a stable hash of the simulation inputs, such as the parameters,
+    payments, mortgage, years, number of simulations and seed.
+    """
+    return hashlib.sha256(repr(describe_inputs(objects)).encode('utf-8')).hexdigest()
+
+
+class simulation_cache:
+    """
+    A least-recently-used cache of simulation results, bounded by the number
+    of bytes held in memory, with an optional directory of .npz files as a
+    second tier.
+    Args:
+      max_bytes: the maximum number of bytes of results held in memory.
+      cache_dir: the directory for cached results on disk, or None.
+      max_disk_bytes: the maximum number of bytes of .npz files kept in
+        cache_dir, evicting the least recently used files, or None for no
+        bound, in which case the directory grows without limit.
+    """
+    def __init__(self, max_bytes=512 * 1024**2, cache_dir=None, max_disk_bytes=None):
+        self._max_bytes = max_bytes
+        self._cache_dir = cache_dir
+        self._max_disk_bytes = max_disk_bytes
+        self._entries = collections.OrderedDict()
+        self._num_bytes = 0
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get_num_bytes(self):
+        return self._num_bytes
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Returns the cached values and net incomes for the key, or None.
+        """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        if self._cache_dir is not None:
+            path = self._get_path(key)
+            if os.path.exists(path):
+                with np.load(path) as data:
+                    result = (data['values'], data['net_incomes'])
+                for array in result:
+                    array.flags.writeable = False
+                # Mark the file as recently used for the disk eviction.
+                os.utime(path)
+                self._add(key, result)
+                return result
+        return None
+
+    def put(self, key, values, net_incomes):
+        """
+        Stores the results for the key. The arrays are made read-only, since
+        they are shared between callers.
+        """
+        values.flags.writeable = False
+        net_incomes.flags.writeable = False
+        self._add(key, (values, net_incomes))
+        if self._cache_dir is not None:
+            # Write to a temporary file first so readers never see a
+            # partial file.
+            path = self._get_path(key)
+            temp_path = path + '.%d.tmp' % os.getpid()
+            with open(temp_path, 'wb') as f:
+                np.savez(f, values=values, net_incomes=net_incomes)
+            os.replace(temp_path, path)
+            self._evict_files()
+
+    def clear(self):
+        self._entries.clear()
+        self._num_bytes = 0
+
+    def _get_path(self, key):
+        return os.path.join(self._cache_dir, key + '.npz')
+
+    def _evict_files(self):
+        if self._max_disk_bytes is None:
+            return
+        paths = [os.path.join(self._cache_dir, name)
+                 for name in os.listdir(self._cache_dir) if name.endswith('.npz')]
+        stats = sorted((os.stat(path).st_mtime, os.stat(path).st_size, path) for path in paths)
+        num_bytes = sum(size for _, size, _ in stats)
+        # Remove the least recently used files first.
+        for _, size, path in stats:
+            if num_bytes <= self._max_disk_bytes:
+                break
+            os.remove(path)
+            num_bytes -= size
+
+    def _add(self, key, result):
+        size = sum(array.nbytes for array in result)
+        if key in self._entries:
+            self._num_bytes -= sum(array.nbytes for array in self._entries.pop(key))
+        if size > self._max_bytes:
+            return
+        self._entries[key] = result
+        self._num_bytes += size
+        # Evict the least recently used results.
+        while self._num_bytes > self._max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._num_bytes -= sum(array.nbytes for array in evicted)
+
+
+_default_cache = simulation_cache()
+
+
+def simulate_portfolio_cached(initial_value,
+                              annual_rate_of_return,
+                              annual_payments,
+                              mortgage,
+                              start_year,
+                              end_year,
+                              num_simulations,
+                              seed,
+                              cache=None):
+    """
+    Simulates the portfolio like simulate_portfolio_arrays, with the results
+    memoized on a hash of all the inputs. Results are only cached when a seed
+    is given, since otherwise every call is meant to be different.
+    Args:
+      seed: the seed for numpy.random.default_rng.
+      cache: the simulation_cache to use, or None for the module default.
+    Returns:
+      read-only values and net incomes, each with shape
+      (num_simulations, num_years + 1).
+    """
+    if seed is None:
+        return simulate_portfolio_arrays(
+            initial_value,
+            annual_rate_of_return,
+            annual_payments,
+            mortgage,
+            start_year,
+            end_year,
+            num_simulations)
+    cache = _default_cache if cache is None else cache
+    key = get_scenario_key(
+        'simulate_portfolio',
+        initial_value,
+        annual_rate_of_return,
+        annual_payments,
+        mortgage,
+        start_year,
+        end_year,
+        num_simulations,
+        seed)
+    result = cache.get(key)
+    if result is None:
+        values, net_incomes = simulate_portfolio_arrays(
+            initial_value,
+            annual_rate_of_return,
+            annual_payments,
+            mortgage,
+            start_year,
+            end_year,
+            num_simulations,
+            rng=np.random.default_rng(seed))
+        cache.put(key, values, net_incomes)
+        result = (values, net_incomes)
+    return result
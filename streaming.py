@@ -0,0 +1,268 @@
+import numpy as np
+
+import analytics
+import instrumentation
+import simulation
+
+
+class quantile_sketch:
+    """
+    A mergeable t-digest style sketch of the distribution in every year.
+    Each year is summarised by at most about compression / 2 weighted
+    centroids, which are small near the tails and large near the median.
+    Args:
+      num_years: the number of years (columns) in each update.
+      compression: the accuracy parameter, larger is more accurate.
+    """
+    def __init__(self, num_years, compression=200):
+        self._num_years = num_years
+        self._compression = compression
+        self._means = np.zeros((0, num_years))
+        self._weights = np.zeros((0, num_years))
+        self._min = np.full(num_years, np.inf)
+        self._max = np.full(num_years, -np.inf)
+        self._count = 0
+
+    def get_count(self):
+        return self._count
+
+    def update(self, values):
+        """
+        Adds samples with shape (num_samples, num_years) to the sketch.
+        """
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return
+        self._min = np.minimum(self._min, values.min(axis=0))
+        self._max = np.maximum(self._max, values.max(axis=0))
+        self._count += len(values)
+        self._compress(np.concatenate([self._means, values]),
+                       np.concatenate([self._weights, np.ones_like(values)]))
+
+    def merge(self, other):
+        """
+        Adds the contents of another sketch to this sketch.
+        """
+        if other._count == 0:
+            return
+        self._min = np.minimum(self._min, other._min)
+        self._max = np.maximum(self._max, other._max)
+        self._count += other._count
+        self._compress(np.concatenate([self._means, other._means]),
+                       np.concatenate([self._weights, other._weights]))
+
+    def _compress(self, means, weights):
+        # Sort every year, then assign each centroid to a group using the
+        # arcsine scale function, so every group spans at most one unit of
+        # the scale.
+        order = np.argsort(means, axis=0)
+        means = np.take_along_axis(means, order, axis=0)
+        weights = np.take_along_axis(weights, order, axis=0)
+        cumulative = np.cumsum(weights, axis=0)
+        q = (cumulative - 0.5 * weights) / cumulative[-1]
+        k = (self._compression / (2.0 * np.pi)) * np.arcsin(np.clip(2.0 * q - 1.0, -1.0, 1.0))
+        num_groups = int(self._compression / 2) + 1
+        groups = np.clip(np.floor(k + self._compression / 4.0).astype(int), 0, num_groups - 1)
+
+        # Sum the weights and weighted means of each group in each year.
+        flat = (groups * self._num_years + np.arange(self._num_years)).ravel()
+        size = num_groups * self._num_years
+        new_weights = np.bincount(flat, weights=weights.ravel(), minlength=size)
+        new_sums = np.bincount(flat, weights=(weights * means).ravel(), minlength=size)
+        new_weights = new_weights.reshape(num_groups, self._num_years)
+        new_sums = new_sums.reshape(num_groups, self._num_years)
+        used = new_weights.any(axis=1)
+        self._weights = new_weights[used]
+        self._means = np.divide(new_sums[used], self._weights,
+                                out=np.zeros_like(self._weights),
+                                where=self._weights > 0)
+
+    def get_quantiles(self, probs):
+        """
+        Estimates quantiles in every year.
+        Returns:
+          an array with shape (len(probs), num_years).
+        """
+        probs = np.asarray(probs, dtype=float)
+        quantiles = np.full((len(probs), self._num_years), np.nan)
+        if self._count == 0:
+            return quantiles
+        for year in range(self._num_years):
+            used = self._weights[:, year] > 0
+            weights = self._weights[used, year]
+            means = self._means[used, year]
+            centers = (np.cumsum(weights) - 0.5 * weights) / self._count
+            quantiles[:, year] = np.interp(
+                probs,
+                np.concatenate([[0.0], centers, [1.0]]),
+                np.concatenate([[self._min[year]], means, [self._max[year]]]))
+        return quantiles
+
+
+class moment_accumulator:
+    """
+    Running mean and variance in every year, mergeable across chunks.
+    """
+    def __init__(self, num_years):
+        self._count = 0
+        self._mean = np.zeros(num_years)
+        self._m2 = np.zeros(num_years)
+
+    def get_count(self):
+        return self._count
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return
+        mean = values.mean(axis=0)
+        self._combine(len(values), mean, np.sum((values - mean)**2, axis=0))
+
+    def merge(self, other):
+        if other._count == 0:
+            return
+        self._combine(other._count, other._mean, other._m2)
+
+    def _combine(self, count, mean, m2):
+        total = self._count + count
+        delta = mean - self._mean
+        self._mean = self._mean + delta * (count / total)
+        self._m2 = self._m2 + m2 + delta**2 * (self._count * count / total)
+        self._count = total
+
+    def get_means(self):
+        return self._mean
+
+    def get_variances(self):
+        """
+        Returns the sample variance in every year.
+        """
+        if self._count < 2:
+            return np.full_like(self._mean, np.nan)
+        return self._m2 / (self._count - 1)
+
+
+class crossing_histogram:
+    """
+    Counts of the first year at which the values cross each threshold.
+    Args:
+      start_year: the first simulated year.
+      num_years: the number of years (columns) in each update.
+      thresholds: the list of thresholds.
+    """
+    def __init__(self, start_year, num_years, thresholds):
+        self._start_year = start_year
+        self._thresholds = list(thresholds)
+        self._counts = np.zeros((len(self._thresholds), max(num_years - 1, 0)), dtype=np.int64)
+        self._never = np.zeros(len(self._thresholds), dtype=np.int64)
+
+    def update(self, values):
+        if not self._thresholds:
+            return
+        all_indices = analytics.get_first_crossing_indices(values, self._thresholds)
+        for i, indices in enumerate(all_indices):
+            crossed = indices[indices >= 0]
+            self._counts[i] += np.bincount(crossed, minlength=self._counts.shape[1])
+            self._never[i] += len(indices) - len(crossed)
+
+    def merge(self, other):
+        self._counts += other._counts
+        self._never += other._never
+
+    def get_thresholds(self):
+        return self._thresholds
+
+    def get_years(self):
+        return self._start_year + np.arange(self._counts.shape[1])
+
+    def get_counts(self):
+        """
+        Returns the number of first crossings in each year, with shape
+        (num_thresholds, num_years - 1), and the number of simulations which
+        never cross each threshold.
+        """
+        return self._counts, self._never
+
+
+class simulation_summary:
+    """
+    Summary statistics of simulated paths which are updated one chunk at a
+    time and can be merged across runs.
+    Args:
+      start_year: the first simulated year.
+      num_years: the number of years (columns) in each update.
+      thresholds: the thresholds for the crossing histograms.
+      compression: the accuracy parameter of the quantile sketches.
+    """
+    def __init__(self, start_year, num_years, thresholds=(), compression=200):
+        self.quantiles_ = quantile_sketch(num_years, compression)
+        self.moments_ = moment_accumulator(num_years)
+        self.crossings_ = crossing_histogram(start_year, num_years, thresholds)
+
+    def update(self, values):
+        with instrumentation.stage('streaming.quantile_sketch'):
+            self.quantiles_.update(values)
+        with instrumentation.stage('streaming.moments'):
+            self.moments_.update(values)
+        with instrumentation.stage('streaming.crossings'):
+            self.crossings_.update(values)
+
+    def merge(self, other):
+        self.quantiles_.merge(other.quantiles_)
+        self.moments_.merge(other.moments_)
+        self.crossings_.merge(other.crossings_)
+
+    def get_count(self):
+        return self.moments_.get_count()
+
+    def get_quantiles(self, probs):
+        return self.quantiles_.get_quantiles(probs)
+
+    def get_means(self):
+        return self.moments_.get_means()
+
+    def get_variances(self):
+        return self.moments_.get_variances()
+
+    def get_crossing_counts(self):
+        return self.crossings_.get_counts()
+
+
+def summarize_portfolio(initial_value,
+                        annual_rate_of_return,
+                        annual_payments,
+                        mortgage,
+                        start_year,
+                        end_year,
+                        num_simulations,
+                        thresholds=(),
+                        chunk_size=10000,
+                        compression=200,
+                        rng=None):
+    """
+    Simulates the portfolio in chunks and keeps only summary statistics, so
+    memory is bounded by chunk_size rather than num_simulations. Arguments are
+    as for simulation.simulate_portfolio_arrays.
+    Args:
+      thresholds: the portfolio values for the crossing histograms.
+      chunk_size: the number of paths simulated at once.
+      compression: the accuracy parameter of the quantile sketches.
+    Returns:
+      simulation_summary objects for the values and the net incomes.
+    """
+    num_columns = end_year - start_year + 1
+    values_summary = simulation_summary(start_year, num_columns, thresholds, compression)
+    net_incomes_summary = simulation_summary(start_year, num_columns, (), compression)
+    for values, net_incomes in simulation.simulate_portfolio_chunks(
+            initial_value,
+            annual_rate_of_return,
+            annual_payments,
+            mortgage,
+            start_year,
+            end_year,
+            num_simulations,
+            chunk_size=chunk_size,
+            rng=rng):
+        values_summary.update(values)
+        net_incomes_summary.update(net_incomes)
+    return values_summary, net_incomes_summary
@@ -0,0 +1,120 @@
+import numpy as np
+
+import analytics
+import instrumentation
+import plotting
+import simulation
+
+
+def _summarize_grid(initial_value, means, stddevs, return_shocks, new_incomes,
+                    probs, thresholds, max_batch_bytes):
+    """
+    Simulates every (mean, stddev) grid point with the same return shocks,
+    in batches of grid points bounded by max_batch_bytes.
+    Returns:
+      quantiles with shape (num_points, len(probs), num_years + 1) and
+      crossing probabilities with shape (num_points, len(thresholds)).
+    """
+    num_simulations, num_years = return_shocks.shape
+    num_points = len(means)
+    point_bytes = 3 * num_simulations * (num_years + 1) * 8
+    batch_size = max(1, int(max_batch_bytes // point_bytes))
+
+    quantiles = np.empty((num_points, len(probs), num_years + 1))
+    crossing_probs = np.empty((num_points, len(thresholds)))
+    for start in range(0, num_points, batch_size):
+        end = min(start + batch_size, num_points)
+        with instrumentation.stage('sweep.recursion'):
+            # Build the rates of return year-major, as advance_values uses them.
+            year_shocks = return_shocks.T[:, np.newaxis, :]
+            rors = (means[np.newaxis, start:end, np.newaxis] +
+                    stddevs[np.newaxis, start:end, np.newaxis] * year_shocks)
+            values = simulation.advance_values(
+                initial_value, np.moveaxis(rors, 0, -1), new_incomes)
+
+        # The values are stored year-major, so this view with the simulation
+        # axis first needs no copy, and one call finds the quantiles of every
+        # year and grid point.
+        batch = end - start
+        flat = np.moveaxis(values, -1, 0).reshape(-1, num_simulations).T
+        quantiles[start:end] = plotting.get_quantiles(flat, probs).reshape(
+            len(probs), num_years + 1, batch).transpose(2, 0, 1)
+        if thresholds:
+            indices = analytics.get_first_crossing_indices(values, thresholds)
+            crossing_probs[start:end] = np.mean(indices >= 0, axis=-1).T
+        instrumentation.count('simulation.paths', batch * num_simulations)
+    return quantiles, crossing_probs
+
+
+def simulate_sweep(initial_value,
+                   rate_of_return_means,
+                   rate_of_return_stddevs,
+                   annual_payments,
+                   mortgage,
+                   start_year,
+                   end_year,
+                   num_simulations,
+                   probs=plotting.CONFIDENCE_PROBS,
+                   thresholds=(),
+                   retirement_years=None,
+                   make_payments=None,
+                   seed=None,
+                   max_batch_bytes=256 * 1024**2):
+    """
+    Simulates the portfolio over a grid of rate of return means and standard
+    deviations, and optionally retirement years. Every grid point reuses the
+    same standard normal shocks, so the whole grid costs about as much as a
+    few individual runs and neighbouring points differ only by the
+    parameters, not by sampling noise. Other arguments are as for
+    simulation.simulate_portfolio_arrays.
+    Args:
+      rate_of_return_means: the grid of annual rate of return means.
+      rate_of_return_stddevs: the grid of annual rate of return stddevs.
+      annual_payments: the list of recurring_payments. Ignored if
+        retirement_years is given.
+      probs: the per-year quantiles to compute at every grid point.
+      thresholds: the portfolio values for the crossing probabilities.
+      retirement_years: an optional grid of retirement years.
+      make_payments: a function returning the list of recurring_payments
+        for a retirement year. Required with retirement_years.
+      seed: the seed for numpy.random.default_rng.
+      max_batch_bytes: the memory bound for the grid points simulated at
+        once.
+    Returns:
+      quantiles with shape (num_means, num_stddevs, len(probs),
+      num_years + 1) and the probability that the values cross each
+      threshold with shape (num_means, num_stddevs, len(thresholds)). With
+      retirement_years, both have an extra retirement year axis after the
+      stddev axis.
+    """
+    if retirement_years is not None and make_payments is None:
+        raise ValueError('make_payments is required with retirement_years')
+    means = np.asarray(rate_of_return_means, dtype=float)
+    stddevs = np.asarray(rate_of_return_stddevs, dtype=float)
+    grid_means, grid_stddevs = [grid.ravel() for grid in np.meshgrid(means, stddevs, indexing='ij')]
+    thresholds = list(thresholds)
+    num_years = end_year - start_year
+
+    with instrumentation.stage('simulation.rng'):
+        shocks = np.random.default_rng(seed).standard_normal((num_simulations, 2, num_years))
+    mortgage_payments = (0.0 if mortgage is None else
+                         simulation.get_mortgage_payments(mortgage, start_year, end_year))
+
+    payment_sets = ([annual_payments] if retirement_years is None else
+                    [make_payments(year) for year in retirement_years])
+    quantiles = []
+    crossing_probs = []
+    for payments in payment_sets:
+        schedule = simulation.payment_schedule(payments, start_year, end_year)
+        new_incomes = schedule.get_incomes_from_shocks(shocks[:, 1]) - mortgage_payments
+        payment_quantiles, payment_crossing_probs = _summarize_grid(
+            initial_value, grid_means, grid_stddevs, shocks[:, 0], new_incomes,
+            probs, thresholds, max_batch_bytes)
+        quantiles.append(payment_quantiles.reshape(
+            len(means), len(stddevs), len(probs), num_years + 1))
+        crossing_probs.append(payment_crossing_probs.reshape(
+            len(means), len(stddevs), len(thresholds)))
+
+    if retirement_years is None:
+        return quantiles[0], crossing_probs[0]
+    return np.stack(quantiles, axis=2), np.stack(crossing_probs, axis=2)
@@ -0,0 +1,26 @@
+import mortgage as mg
+import simulation as sim
+
+START_YEAR = 2020
+END_YEAR = 2060
+
+
+def make_payments(payment_stdev=0.02):
+    return [
+        sim.recurring_payment('salary', 200000, 1.03, payment_stdev, START_YEAR, START_YEAR + 20),
+        sim.recurring_payment('expenses', -120000, 1.02, payment_stdev, START_YEAR, END_YEAR),
+        sim.recurring_payment('pension', 40000, 1.02, payment_stdev, START_YEAR + 20, END_YEAR),
+    ]
+
+
+def make_mortgage():
+    return mg.mortgage(
+        principal_loan_amount=800000,
+        loan_down_payment=200000,
+        annual_interest_rate=0.03,
+        mortgage_term_years=25,
+        start_year=START_YEAR + 2)
+
+
+def make_rate_of_return(mean=1.06, stddev=0.15):
+    return sim.simulated_parameter('annual_rate_of_return', mean, stddev, START_YEAR, END_YEAR)
@@ -0,0 +1,24 @@
+import numpy as np
+
+import runner
+from helpers import END_YEAR, START_YEAR, make_mortgage, make_payments, make_rate_of_return
+
+
+def _simulate(tolerance, **kwargs):
+    return runner.simulate_portfolio_adaptive(
+        400000.0, make_rate_of_return(), make_payments(), make_mortgage(),
+        START_YEAR, END_YEAR, tolerance, seed=1, **kwargs)
+
+
+def test_stops_once_tolerance_is_reached():
+    values, net_incomes, precision, num_simulations = _simulate(0.02, max_simulations=50000)
+    assert precision <= 0.02
+    assert num_simulations < 50000
+    assert values.shape == net_incomes.shape == (num_simulations, END_YEAR - START_YEAR + 1)
+
+
+def test_threshold_without_crossings_has_infinite_precision():
+    values, _, precision, num_simulations = _simulate(
+        0.1, threshold=1e12, max_simulations=5000)
+    assert precision == np.inf
+    assert num_simulations == len(values) == 5000
@@ -0,0 +1,40 @@
+import numpy as np
+
+import analytics
+
+
+def _make_values():
+    rng = np.random.default_rng(5)
+    values = np.cumsum(rng.normal(0.0, 1.0, (500, 25)), axis=1)
+    values[::5, 3] = 1.0
+    return values
+
+
+def test_crossing_years_match_scan():
+    values = _make_values()
+    years = np.arange(2020, 2045)
+    thresholds = [1.0, -2.0, 100.0]
+    crossing_years = analytics.get_crossing_years(values, years, thresholds)
+    for threshold, threshold_years in zip(thresholds, crossing_years):
+        for v, year in zip(values, threshold_years):
+            expected = np.nan
+            for y in range(len(years) - 1):
+                if ((v[y + 1] > threshold and v[y] < threshold) or
+                        (v[y + 1] < threshold and v[y] > threshold)):
+                    expected = years[y]
+                    break
+            np.testing.assert_equal(year, expected)
+
+
+def test_prob_less_matches_pairwise_count():
+    rng = np.random.default_rng(6)
+    samples = [rng.integers(2030, 2060, 300).astype(float) for _ in range(3)]
+    samples[1][::4] = np.nan
+    probs = analytics.compare_scenarios(samples)
+    for i, a in enumerate(samples):
+        for j, b in enumerate(samples):
+            a_valid = a[~np.isnan(a)]
+            b_valid = b[~np.isnan(b)]
+            expected = np.mean(a_valid[:, np.newaxis] < b_valid[np.newaxis, :])
+            assert abs(probs[i, j] - expected) < 1e-12
+            assert abs(analytics.get_prob_less(a, b) - expected) < 1e-12
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+import assets
+import simulation as sim
+from helpers import END_YEAR, START_YEAR, make_mortgage, make_payments
+
+
+# A riskless cash asset makes the covariance only semi-definite.
+COVARIANCE = np.array([[0.04, 0.006, 0.0],
+                       [0.006, 0.0025, 0.0],
+                       [0.0, 0.0, 0.0]])
+
+
+def _make_model(allocations):
+    return assets.multi_asset_return(
+        'annual_rate_of_return', ['stocks', 'bonds', 'cash'], [1.07, 1.03, 1.01],
+        COVARIANCE, allocations, START_YEAR, END_YEAR)
+
+
+def test_asset_draws_have_the_covariance():
+    num_years = END_YEAR - START_YEAR
+    glide_path = np.linspace([0.8, 0.2, 0.0], [0.2, 0.5, 0.3], num_years)
+    model = _make_model(glide_path)
+    asset_values = model.get_asset_values(20000, rng=np.random.default_rng(1))
+    assert asset_values.shape == (20000, num_years, 3)
+    flat = asset_values.reshape(-1, 3)
+    np.testing.assert_allclose(flat.mean(axis=0), [1.07, 1.03, 1.01], atol=1e-3)
+    np.testing.assert_allclose(np.cov(flat.T), COVARIANCE, atol=5e-4)
+
+    # The rebalanced portfolio has the moments used for the fast draws.
+    portfolio = model.get_portfolio_values(asset_values)
+    np.testing.assert_allclose(portfolio.mean(axis=0), model.get_portfolio_means(), atol=5e-3)
+    np.testing.assert_allclose(portfolio.std(axis=0), model.get_portfolio_stddevs(), rtol=0.03)
+
+
+def test_plugs_into_the_engine():
+    model = _make_model([0.6, 0.3, 0.1])
+    values, _ = sim.simulate_portfolio_arrays(
+        400000.0, model, make_payments(), make_mortgage(), START_YEAR, END_YEAR, 100,
+        rng=np.random.default_rng(2), sampling='antithetic')
+    assert values.shape == (100, END_YEAR - START_YEAR + 1)
+
+
+def test_rejects_invalid_covariance():
+    with pytest.raises(ValueError):
+        assets.get_covariance_factor([[1.0, 2.0], [2.0, 1.0]])
+    with pytest.raises(ValueError):
+        assets.get_covariance_factor([[1.0, 0.5], [0.0, 1.0]])
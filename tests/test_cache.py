@@ -0,0 +1,37 @@
+import os
+
+import numpy as np
+import pytest
+
+import simulation as sim
+from helpers import END_YEAR, START_YEAR, make_mortgage, make_payments, make_rate_of_return
+
+
+def _simulate(cache, seed):
+    return sim.simulate_portfolio_cached(
+        400000.0, make_rate_of_return(), make_payments(), make_mortgage(),
+        START_YEAR, END_YEAR, 200, seed, cache=cache)
+
+
+def test_cached_results_are_read_only_from_both_tiers(tmp_path):
+    values, _ = _simulate(sim.simulation_cache(cache_dir=str(tmp_path)), seed=1)
+    # A new cache only has the result on disk.
+    disk_values, disk_net_incomes = _simulate(sim.simulation_cache(cache_dir=str(tmp_path)), seed=1)
+    np.testing.assert_array_equal(disk_values, values)
+    for array in (values, disk_values, disk_net_incomes):
+        assert not array.flags.writeable
+        with pytest.raises(ValueError):
+            array[0, 0] = 0.0
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    entry_bytes = 2 * 200 * (END_YEAR - START_YEAR + 1) * 8
+    cache = sim.simulation_cache(cache_dir=str(tmp_path), max_disk_bytes=int(2.5 * entry_bytes))
+    for seed in range(4):
+        _simulate(cache, seed)
+    assert len(os.listdir(tmp_path)) == 2
+    # The files of the two most recent results are kept.
+    cache.clear()
+    assert cache.get(sim.get_scenario_key(
+        'simulate_portfolio', 400000.0, make_rate_of_return(), make_payments(), make_mortgage(),
+        START_YEAR, END_YEAR, 200, 3)) is not None
@@ -0,0 +1,46 @@
+import os
+import pathlib
+
+import numpy as np
+
+import historical
+
+
+def _write_csv(path, returns):
+    with open(path, 'w') as f:
+        f.write('year,return\n')
+        for i, value in enumerate(returns):
+            f.write('%d,%r\n' % (1950 + i, float(value)))
+
+
+def test_load_returns_from_csv_path(tmp_path):
+    returns = np.random.default_rng(1).normal(0.06, 0.15, 60)
+    path = tmp_path / 'returns.csv'
+    _write_csv(path, returns)
+    for _ in range(2):
+        # The second load maps the cached .npy file.
+        loaded = historical.load_returns(path)
+        np.testing.assert_allclose(loaded, returns)
+    assert isinstance(loaded, np.memmap)
+    assert sorted(os.listdir(tmp_path)) == ['returns.csv', 'returns.csv.npy']
+
+
+def test_historical_return_accepts_path(tmp_path):
+    path = tmp_path / 'returns.npy'
+    np.save(path, np.array([0.1, -0.2, 0.05]))
+    source = historical.historical_return('r', pathlib.Path(path), 2020, 2030, growth=False)
+    values = source.get_simulated_values((1000, 10), rng=np.random.default_rng(2))
+    assert values.shape == (1000, 10)
+    assert set(np.unique(values)) <= {0.8, 1.05, 1.1}
+
+
+def test_bootstrap_indices():
+    rng = np.random.default_rng(3)
+    indices = historical.get_bootstrap_indices(100, (5000, 40), 5, 'stationary', rng)
+    assert indices.min() >= 0 and indices.max() < 100
+    # Blocks continue with probability 1 - 1 / block_length.
+    continued = np.mean(np.diff(indices, axis=1) % 100 == 1)
+    assert abs(continued - 0.8) < 0.01
+    indices = historical.get_bootstrap_indices(100, (5000, 40), 8, 'moving', rng)
+    assert indices.min() >= 0 and indices.max() < 100
+    assert np.all(np.diff(indices.reshape(5000, 5, 8), axis=2) == 1)
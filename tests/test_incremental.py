@@ -0,0 +1,31 @@
+import numpy as np
+
+import simulation as sim
+from helpers import END_YEAR, START_YEAR, make_mortgage, make_payments, make_rate_of_return
+
+
+def _incremental(payments, mortgage, rate_of_return):
+    return sim.simulate_portfolio_incremental(
+        400000.0, rate_of_return, payments, mortgage, START_YEAR, END_YEAR, 500,
+        rng=np.random.default_rng(11))
+
+
+def _assert_same_results(state, expected_state):
+    for result, expected in zip(state.get_results(), expected_state.get_results()):
+        np.testing.assert_allclose(result, expected, rtol=1e-9, atol=1e-6)
+
+
+def test_incremental_updates_match_fresh_run():
+    payments = make_payments()
+    state = _incremental(payments, make_mortgage(), make_rate_of_return())
+
+    new_payments = list(payments)
+    new_payments[1] = sim.recurring_payment('expenses', -90000, 1.02, 0.05, START_YEAR + 5, END_YEAR)
+    state.update_payment(1, new_payments[1])
+    _assert_same_results(state, _incremental(new_payments, make_mortgage(), make_rate_of_return()))
+
+    state.update_mortgage(None)
+    _assert_same_results(state, _incremental(new_payments, None, make_rate_of_return()))
+
+    state.update_rate_of_return(make_rate_of_return(1.04, 0.1))
+    _assert_same_results(state, _incremental(new_payments, None, make_rate_of_return(1.04, 0.1)))
@@ -0,0 +1,65 @@
+import numpy as np
+
+import monthly
+import simulation as sim
+from helpers import END_YEAR, START_YEAR, make_mortgage, make_payments, make_rate_of_return
+
+
+def _loop_simulate(rate_of_return, additional_monthly_payment, num_simulations, seed):
+    # A month by month loop with the same draws as simulate_portfolio_monthly.
+    rng = np.random.default_rng(seed)
+    num_months = 12 * (END_YEAR - START_YEAR)
+    rors = rate_of_return.get_monthly_values((num_months, num_simulations), rng=rng)
+    schedule = sim.payment_schedule(make_payments(), START_YEAR, END_YEAR)
+    shocks = rng.standard_normal((num_months, num_simulations))
+    mortgage_payments = monthly.get_monthly_mortgage_payments(
+        make_mortgage(), START_YEAR, END_YEAR, additional_monthly_payment)
+    values = np.empty((num_simulations, num_months + 1))
+    values[:, 0] = 400000.0
+    for month in range(num_months):
+        year = month // 12
+        income = (schedule.get_mean_income()[year] / 12.0 +
+                  schedule.get_income_stddev()[year] / np.sqrt(12.0) * shocks[month] -
+                  mortgage_payments[month])
+        previous = values[:, month]
+        values[:, month + 1] = np.where(previous > 0, previous * rors[month], previous) + income
+    return values
+
+
+def test_monthly_matches_loop():
+    rate_of_return = make_rate_of_return()
+    for extra in [0.0, 1500.0]:
+        values, net_incomes = monthly.simulate_portfolio_monthly(
+            400000.0, rate_of_return, make_payments(), make_mortgage(), START_YEAR, END_YEAR,
+            200, additional_monthly_payment=extra, aggregate='monthly',
+            rng=np.random.default_rng(5))
+        expected = _loop_simulate(rate_of_return, extra, 200, seed=5)
+        np.testing.assert_allclose(values, expected, rtol=1e-10)
+        assert net_incomes.shape == values.shape
+
+        annual_values, annual_net_incomes = monthly.simulate_portfolio_monthly(
+            400000.0, rate_of_return, make_payments(), make_mortgage(), START_YEAR, END_YEAR,
+            200, additional_monthly_payment=extra, rng=np.random.default_rng(5))
+        np.testing.assert_array_equal(annual_values, values[:, ::12])
+        np.testing.assert_allclose(
+            annual_net_incomes[:, 1:],
+            net_incomes[:, 1:].reshape(200, -1, 12).sum(axis=2))
+
+
+def test_monthly_mortgage_payments_stop_when_paid_off():
+    mortgage = make_mortgage()
+    payments = mortgage.calculate_monthly_payments()
+    assert len(payments) == 12 * mortgage.mortgage_term_years_
+    np.testing.assert_allclose(payments.sum(), mortgage.get_annual_payment() * mortgage.mortgage_term_years_)
+    extra_payments = mortgage.calculate_monthly_payments(2000.0)
+    num_paid = np.count_nonzero(extra_payments)
+    assert num_paid == mortgage.calculate_months_until_paid_off(2000.0)
+    assert np.all(extra_payments[num_paid:] == 0.0)
+
+
+def test_monthly_values_match_annual_moments():
+    rate_of_return = make_rate_of_return(1.06, 0.15)
+    monthly_values = rate_of_return.get_monthly_values((12, 200000), rng=np.random.default_rng(6))
+    annual = monthly_values.prod(axis=0)
+    assert abs(annual.mean() - 1.06) < 0.002
+    assert abs(annual.std() - 0.15) < 0.002
@@ -0,0 +1,32 @@
+import numpy as np
+
+import mortgage as mg
+
+
+def _scan_years_until_paid_off(mortgage, additional_annual_payment):
+    # The original year-by-year scan.
+    for year in range(mortgage.mortgage_term_years_ + 1):
+        if mortgage.calculate_debt_at_year(year, additional_annual_payment) < 0:
+            return year
+    return mortgage.mortgage_term_years_
+
+
+def _scan_months_until_paid_off(mortgage, additional_monthly_payment):
+    # The original 12 * term step scan.
+    for month in range(12 * int(mortgage.mortgage_term_years_) + 1):
+        if mortgage.calculate_debt_at_month(month, additional_monthly_payment) < 0:
+            return month
+    return mortgage.mortgage_term_years_ * 12.0
+
+
+def test_payoff_matches_scan():
+    rng = np.random.default_rng(1)
+    for _ in range(500):
+        mortgage = mg.mortgage(
+            rng.uniform(1e5, 2e6), 0, rng.uniform(0.005, 0.09), int(rng.integers(5, 41)), 2020)
+        extra = rng.choice([0.0, rng.uniform(0, 100), rng.uniform(0, 5000)])
+        years = mortgage.calculate_years_until_paid_off(12 * extra)
+        months = mortgage.calculate_months_until_paid_off(extra)
+        assert years == _scan_years_until_paid_off(mortgage, 12 * extra)
+        assert months == _scan_months_until_paid_off(mortgage, extra)
+        assert type(months) == type(_scan_months_until_paid_off(mortgage, extra))
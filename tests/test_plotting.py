@@ -0,0 +1,49 @@
+import numpy as np
+
+import plotting
+
+
+def _list_confidence_interval(values):
+    # The original per-year sort over lists.
+    indices = [int(prob * float(len(values))) for prob in plotting.CONFIDENCE_PROBS]
+    bands = [[] for _ in indices]
+    for year in range(len(values[0])):
+        yearly_values = sorted(v[year] for v in values)
+        for band, index in zip(bands, indices):
+            band.append(yearly_values[index])
+    return bands
+
+
+def _list_crossing_dates(values, years, threshold):
+    # The original scan for the first crossing of each path.
+    results = []
+    for v in values:
+        for y in range(len(years) - 1):
+            if ((v[y + 1] > threshold and v[y] < threshold) or
+                    (v[y + 1] < threshold and v[y] > threshold)):
+                results.append(years[y])
+                break
+    return results
+
+
+def _make_values():
+    rng = np.random.default_rng(3)
+    values = np.cumsum(rng.normal(0.0, 1.0, (997, 30)), axis=1)
+    # Include exact threshold hits, which are not crossings.
+    values[::7, 5] = 0.0
+    return values
+
+
+def test_confidence_interval_matches_lists():
+    values = _make_values()
+    expected = _list_confidence_interval(values.tolist())
+    for band, expected_band in zip(plotting.get_confidence_interval(values), expected):
+        np.testing.assert_array_equal(band, expected_band)
+
+
+def test_crossing_dates_match_lists():
+    values = _make_values()
+    years = list(range(2020, 2050))
+    for threshold in [0.0, 2.5, -4.0]:
+        expected = _list_crossing_dates(values.tolist(), years, threshold)
+        assert plotting.get_crossing_dates(values, years, threshold) == expected
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+import plotting
+import result_store
+
+
+def _chunk(num_paths, value):
+    return np.full((num_paths, 11), value), np.full((num_paths, 11), -value)
+
+
+def test_round_trip(tmp_path):
+    values = np.random.default_rng(1).normal(size=(100, 11))
+    with result_store.result_writer(str(tmp_path), 100, 2020, 2030, metadata={'seed': 3}) as writer:
+        writer.append(values[:60], -values[:60])
+        writer.append(values[60:], -values[60:])
+    stored_values, stored_net_incomes, header = result_store.open_results(str(tmp_path))
+    np.testing.assert_array_equal(stored_values, values)
+    np.testing.assert_array_equal(stored_net_incomes, -values)
+    assert header['seed'] == 3
+    np.testing.assert_array_equal(
+        result_store.get_quantiles(stored_values, [0.1, 0.5], years_per_chunk=3),
+        plotting.get_quantiles(values, [0.1, 0.5]))
+
+
+def test_interrupted_store_cannot_be_opened(tmp_path):
+    with result_store.result_writer(str(tmp_path), 100, 2020, 2030) as writer:
+        writer.append(*_chunk(100, 1.0))
+    with pytest.raises(KeyboardInterrupt):
+        with result_store.result_writer(str(tmp_path), 100, 2020, 2030) as writer:
+            writer.append(*_chunk(40, 2.0))
+            raise KeyboardInterrupt
+    with pytest.raises(ValueError):
+        result_store.open_results(str(tmp_path))
+
+
+def test_store_closed_early_only_returns_written_paths(tmp_path):
+    writer = result_store.result_writer(str(tmp_path), 100, 2020, 2030)
+    writer.append(*_chunk(40, 2.0))
+    writer.close()
+    values, net_incomes, header = result_store.open_results(str(tmp_path))
+    assert header['num_written'] == 40
+    assert values.shape == net_incomes.shape == (40, 11)
+    np.testing.assert_array_equal(result_store.get_quantiles(values, [0.5]), 2.0)
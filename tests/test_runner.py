@@ -0,0 +1,29 @@
+import numpy as np
+
+import runner
+from helpers import END_YEAR, START_YEAR, make_mortgage, make_payments, make_rate_of_return
+
+
+def _simulate(num_workers, summarize=False):
+    return runner.simulate_portfolio_sharded(
+        400000.0, make_rate_of_return(), make_payments(), make_mortgage(),
+        START_YEAR, END_YEAR, 2500, seed=7, num_workers=num_workers,
+        shard_size=1000, summarize=summarize, thresholds=[2000000.0])
+
+
+def test_sharded_results_do_not_depend_on_num_workers():
+    values_1, net_incomes_1 = _simulate(num_workers=1)
+    values_3, net_incomes_3 = _simulate(num_workers=3)
+    assert values_1.shape == (2500, END_YEAR - START_YEAR + 1)
+    np.testing.assert_array_equal(values_1, values_3)
+    np.testing.assert_array_equal(net_incomes_1, net_incomes_3)
+
+
+def test_sharded_summaries_do_not_depend_on_num_workers():
+    summary_1, _ = _simulate(num_workers=1, summarize=True)
+    summary_2, _ = _simulate(num_workers=2, summarize=True)
+    np.testing.assert_array_equal(summary_1.get_quantiles([0.1, 0.5, 0.9]),
+                                  summary_2.get_quantiles([0.1, 0.5, 0.9]))
+    np.testing.assert_array_equal(summary_1.get_means(), summary_2.get_means())
+    for counts_1, counts_2 in zip(summary_1.get_crossing_counts(), summary_2.get_crossing_counts()):
+        np.testing.assert_array_equal(counts_1, counts_2)
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+import simulation as sim
+
+
+def test_antithetic_pairs_cancel_for_odd_counts():
+    for num_simulations in [1001, 1024]:
+        shocks = sim.draw_standard_normals(
+            (num_simulations, 3), 'antithetic', rng=np.random.default_rng(2))
+        # The shocks are a linear statistic, so every pair averages to zero.
+        np.testing.assert_allclose(sim.get_standard_error(shocks, 'antithetic'), 0.0, atol=1e-12)
+
+
+@pytest.mark.parametrize('sampling', sim.SAMPLING_MODES)
+@pytest.mark.parametrize('num_simulations', [511, 512])
+def test_standard_error_matches_spread(sampling, num_simulations):
+    rng = np.random.default_rng(3)
+    means = []
+    errors = []
+    for _ in range(200):
+        values = np.exp(0.5 * sim.draw_standard_normals(
+            (num_simulations, 2), sampling, rng=rng))
+        means.append(values.mean(axis=0))
+        errors.append(sim.get_standard_error(values, sampling))
+    ratio = np.mean(errors, axis=0) / np.std(means, axis=0, ddof=1)
+    assert np.all((ratio > 0.7) & (ratio < 1.4)), ratio
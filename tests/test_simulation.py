@@ -0,0 +1,51 @@
+import numpy as np
+
+import simulation as sim
+from helpers import END_YEAR, START_YEAR, make_mortgage, make_payments, make_rate_of_return
+
+
+def _list_simulate_portfolio(initial_value, annual_rate_of_return, annual_payments,
+                             mortgage, start_year, end_year, num_simulations):
+    # The original loop over simulations and years.
+    values = []
+    net_incomes = []
+    for _ in range(num_simulations):
+        for p in annual_payments:
+            p.reset()
+        curr_values = [initial_value]
+        curr_net_incomes = []
+        for year in range(start_year, end_year):
+            new_income = 0
+            for p in annual_payments:
+                new_income += p.simulate_payment(year)
+                p.update_payment()
+            if (mortgage is None or year < mortgage.start_year_ or
+                    year >= mortgage.start_year_ + mortgage.mortgage_term_years_):
+                mortgage_payment = 0.0
+            else:
+                mortgage_payment = mortgage.get_annual_payment()
+            new_income -= mortgage_payment
+            ror = annual_rate_of_return.get_simulated_value()
+            if curr_values[-1] > 0:
+                new_value = (curr_values[-1] * ror) + new_income
+            else:
+                new_value = curr_values[-1] + new_income
+            if len(curr_net_incomes) == 0:
+                curr_net_incomes.append(new_income)
+            curr_net_incomes.append(new_income)
+            curr_values.append(new_value)
+        net_incomes.append(curr_net_incomes)
+        values.append(curr_values)
+    return values, net_incomes
+
+
+def test_simulate_portfolio_matches_lists_without_noise():
+    # Without noise both versions are deterministic and must agree.
+    for initial_value in [400000.0, -300000.0]:
+        args = (initial_value, make_rate_of_return(stddev=0.0), make_payments(payment_stdev=0.0),
+                make_mortgage(), START_YEAR, END_YEAR, 3)
+        values, net_incomes = sim.simulate_portfolio(*args)
+        expected_values, expected_net_incomes = _list_simulate_portfolio(*args)
+        assert isinstance(values, list) and isinstance(net_incomes, list)
+        np.testing.assert_allclose(values, expected_values, rtol=1e-12)
+        np.testing.assert_allclose(net_incomes, expected_net_incomes, rtol=1e-12)
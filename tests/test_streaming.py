@@ -0,0 +1,33 @@
+import numpy as np
+
+import streaming
+
+
+def test_sketch_quantiles_are_accurate_after_merging():
+    rng = np.random.default_rng(1)
+    values = np.exp(rng.normal(0.0, 1.0, (40000, 3)))
+    sketches = []
+    for chunk in np.array_split(values, 4):
+        sketch = streaming.quantile_sketch(3)
+        for part in np.array_split(chunk, 5):
+            sketch.update(part)
+        sketches.append(sketch)
+    for sketch in sketches[1:]:
+        sketches[0].merge(sketch)
+    probs = np.array([0.001, 0.045, 0.317, 0.5, 0.683, 0.955, 0.999])
+    estimates = sketches[0].get_quantiles(probs)
+    assert sketches[0].get_count() == len(values)
+    # Compare the ranks of the estimates with the requested probabilities.
+    ranks = np.mean(values[:, np.newaxis, :] <= estimates[np.newaxis], axis=0)
+    assert np.abs(ranks - probs[:, np.newaxis]).max() < 0.002
+
+
+def test_moments_match_numpy_after_merging():
+    values = np.random.default_rng(2).normal(5.0, 2.0, (1001, 4))
+    moments = streaming.moment_accumulator(4)
+    other = streaming.moment_accumulator(4)
+    moments.update(values[:300])
+    other.update(values[300:])
+    moments.merge(other)
+    np.testing.assert_allclose(moments.get_means(), values.mean(axis=0))
+    np.testing.assert_allclose(moments.get_variances(), values.var(axis=0, ddof=1))
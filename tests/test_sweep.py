@@ -0,0 +1,31 @@
+import numpy as np
+
+import analytics
+import plotting
+import simulation as sim
+import sweep
+from helpers import END_YEAR, START_YEAR, make_mortgage, make_payments
+
+
+def test_grid_point_matches_simulation_with_same_shocks():
+    means = [1.03, 1.06]
+    stddevs = [0.05, 0.15, 0.2]
+    probs = [0.1, 0.5, 0.9]
+    thresholds = [1000000.0]
+    num_simulations = 300
+    quantiles, crossing_probs = sweep.simulate_sweep(
+        400000.0, means, stddevs, make_payments(), make_mortgage(), START_YEAR, END_YEAR,
+        num_simulations, probs=probs, thresholds=thresholds, seed=4)
+    assert quantiles.shape == (2, 3, len(probs), END_YEAR - START_YEAR + 1)
+
+    shocks = np.random.default_rng(4).standard_normal(
+        (num_simulations, 2, END_YEAR - START_YEAR))
+    for i, j in [(0, 0), (1, 2)]:
+        rate_of_return = sim.simulated_parameter(
+            'annual_rate_of_return', means[i], stddevs[j], START_YEAR, END_YEAR)
+        values, _ = sim.simulate_portfolio_arrays(
+            400000.0, rate_of_return, make_payments(), make_mortgage(), START_YEAR, END_YEAR,
+            num_simulations, shocks=shocks)
+        np.testing.assert_allclose(quantiles[i, j], plotting.get_quantiles(values, probs), rtol=1e-12)
+        indices = analytics.get_first_crossing_indices(values, thresholds)
+        np.testing.assert_allclose(crossing_probs[i, j], np.mean(indices >= 0, axis=-1))